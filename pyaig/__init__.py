@@ -1,12 +1,17 @@
-from . aig import AIG
+from . aig import AIG, FrozenAIG
 from . aigexpr import aigexpr
 
 from . aig_io import unflatten_aiger, flatten_aiger
 from . aig_io import read_aiger, write_aiger
+from . aig_io import aiger_info, read_aiger_many
 from . aig_io import write_cnf
 from . aig_io import marshal_aiger, unmarshal_aiger
+from . aig_io import share_aig, attach_aig
+from . aig_io import write_snapshot, read_snapshot
 
 from . simulate import read_cex, simulate, print_cex
+from . simulate import simulate_words, pack_traces, iter_simulate, wavefront_simulator
+from . simulate import random_simulate, find_constant_latches
 
 from . import primitives
 from . import utils
@@ -1,7 +1,10 @@
+import time
+
 import click
 
 from . aig import AIG
 from . aig_io import read_aiger, write_aiger
+from . aig_io import marshal_aiger, unmarshal_aiger
 
 
 @click.group()
@@ -28,4 +31,32 @@ def live(src, dst):
     write_aiger(aig, dst)
 
 
+@cli.command('bench-marshal')
+@click.argument('src', type=click.Path(exists=True, dir_okay=False))
+@click.option('--rounds', default=10, help='number of round trips')
+def bench_marshal(src, rounds):
+    """ Measure the marshal_aiger() / unmarshal_aiger() round-trip throughput. """
+
+    aig = read_aiger(src)
+
+    marshal_time = 0.0
+    unmarshal_time = 0.0
+
+    for _ in range(rounds):
+
+        start = time.time()
+        data = marshal_aiger(aig)
+        marshal_time += time.time() - start
+
+        start = time.time()
+        unmarshal_aiger(data)
+        unmarshal_time += time.time() - start
+
+    n_bytes = len(data) * rounds
+
+    click.echo('%d bytes, %d AND gates' % (len(data), aig.n_ands()))
+    click.echo('marshal:   %.3fs per AIG, %.1f MB/s' % (marshal_time / rounds, n_bytes / marshal_time / 1e6))
+    click.echo('unmarshal: %.3fs per AIG, %.1f MB/s' % (unmarshal_time / rounds, n_bytes / unmarshal_time / 1e6))
+
+
 cli()
@@ -4,11 +4,30 @@
 # Simple Python AIG package
 
 from past.builtins import xrange
+from future.builtins import zip
 from future.utils import iteritems
 
+import bisect
+import heapq
 import itertools
+import sys
+
+from array import array
+
+def _copy_array(a):
+    """ return a copy of the array or memoryview 'a' as an array """
+    typecode = a.typecode if isinstance(a, array) else a.format
+    res = array(typecode)
+    res.frombytes( memoryview(a).cast('B') )
+    return res
+
+def _readonly(a):
+    return memoryview(a).toreadonly()
 
 class _Node(object):
+    """ A lightweight view of a single node stored in an _Nodes object """
+    
+    __slots__ = ('_nodes', '_id')
     
     # Node types
     
@@ -24,130 +43,99 @@ class _Node(object):
     INIT_ONE = 1
     INIT_NONDET = 2
     
-    def __init__(self, node_type, left=0, right=0):
-        self._type = node_type
-        self._left = left
-        self._right = right
-    
-    # creation
-    
-    @staticmethod
-    def make_const0():
-        return _Node(_Node.CONST0)
-        
-    @staticmethod
-    def make_pi(pi_id):
-        return _Node( _Node.PI, pi_id, 0)
+    def __init__(self, nodes, i):
+        self._nodes = nodes
+        self._id = i
     
-    @staticmethod
-    def make_latch(l_id, init, next=None):
-        return _Node( _Node.LATCH, l_id, (init, next))
+    @property
+    def _type(self):
+        return self._nodes._type[self._id]
     
-    @staticmethod
-    def make_and(left, right):
-        return _Node(_Node.AND, left, right)
-
-    @staticmethod
-    def make_buffer(buf_id, buf_in):
-        return _Node(_Node.BUFFER, buf_id, buf_in)
-
     # query type
     
     def is_const0(self):
-        return self._type == _Node.CONST0
+        return self._nodes._type[self._id] == _Node.CONST0
     
     def is_pi(self):
-        return self._type == _Node.PI
+        return self._nodes._type[self._id] == _Node.PI
     
     def is_and(self):
-        return self._type == _Node.AND
+        return self._nodes._type[self._id] == _Node.AND
     
     def is_buffer(self):
-        return self._type == _Node.BUFFER
+        return self._nodes._type[self._id] == _Node.BUFFER
     
     def is_latch(self):
-        return self._type == _Node.LATCH
+        return self._nodes._type[self._id] == _Node.LATCH
         
     def is_nonterminal(self):
-        return self._type in (_Node.AND,_Node.BUFFER)
+        return self._nodes._type[self._id] in (_Node.AND,_Node.BUFFER)
     
     def get_fanins(self):
-        if self._type == _Node.AND:
-            return [self._left, self._right]
-        elif self._type == _Node.BUFFER:
-            return [self._right]
-        else:
-            return []
+        return self._nodes.get_fanins(self._id)
     
     def get_seq_fanins(self):
-        if self._type == _Node.AND:
-            return [self._left, self._right]
-        elif self._type == _Node.BUFFER:
-            return [self._right]
-        elif self._type == _Node.LATCH:
-            return [self._right[1]]
-        else:
-            return []
+        return self._nodes.get_seq_fanins(self._id)
     
     # AND gates
     
     def get_left(self):
         assert self.is_and()
-        return self._left
+        return self._nodes._left[self._id]
     
     def get_right(self):
         assert self.is_and()
-        return self._right
+        return self._nodes._right[self._id]
     
     # Buffer
     
     def get_buf_id(self):
-        return self._left
+        return self._nodes._left[self._id]
         
     def get_buf_in(self):
         assert self.is_buffer()
-        return self._right
+        return self._nodes._right[self._id]
         
     def set_buf_in(self, f):
         assert self.is_buffer()
-        self._right = f
+        self._nodes._right[self._id] = f
     
     def convert_buf_to_pi(self, pi_id):
         assert self.is_buffer()
-        self._type = _Node.PI
-        self._left = pi_id
-        self._right = 0
+        self._nodes.set_node(self._id, _Node.PI, pi_id, 0)
     
     # PIs
     
     def get_pi_id(self):
         assert self.is_pi()
-        return self._left
+        return self._nodes._left[self._id]
     
     def get_latch_id(self):
         assert self.is_latch()
-        return self._left
+        return self._nodes._left[self._id]
     
     # Latches
     
     def get_init(self):
         assert self.is_latch()
-        return self._right[0]
+        return self._nodes.get_init(self._id)
     
     def get_next(self):
         assert self.is_latch()
-        return self._right[1]
+        return self._nodes.get_next(self._id)
     
     def set_init(self, init):
         assert self.is_latch()
-        self._right = (init, self._right[1])
+        self._nodes.set_init(self._id, init)
         
     def set_next(self, f):
         assert self.is_latch()
-        self._right = (self._right[0], f)
+        self._nodes.set_next(self._id, f)
 
     def __repr__(self):
         type = "ERROR"
+        left = self._nodes._left[self._id]
+        right = self._nodes._right[self._id]
         if self._type==_Node.AND:
             type = "AND"
         elif self._type==_Node.BUFFER:
@@ -156,11 +144,137 @@ class _Node(object):
             type = "CONST0"
         elif self._type==_Node.LATCH:
             type = "LATCH"
+            right = (self.get_init(), self.get_next())
         elif self._type==_Node.PI:
             type = "PI"
-        return "<pyaig.aig._Node _type=%s, _left=%s, _right=%s>"%(type, str(self._left), str(self._right))
+        return "<pyaig.aig._Node _type=%s, _left=%s, _right=%s>"%(type, str(left), str(right))
+
+class _Nodes(object):
+    """ The nodes of an AIG, stored in parallel typed arrays.
+
+    Node 'i' has type '_type[i]'. For PIs, latches and buffers '_left[i]' is the
+    PI, latch or buffer id; for AND gates '_left[i]' and '_right[i]' are the fanins,
+    and for buffers '_right[i]' is the buffer input. Latch 'j' has its initialization
+    in '_latch_init[j]' and its next-state function in '_latch_next[j]' (-1 if unset).
+    """
+    
+    NO_NEXT = -1
+    
+    def __init__(self):
+        self._type = array('b', [_Node.CONST0])
+        self._left = array('i', [0])
+        self._right = array('i', [0])
+        self._latch_init = array('b')
+        self._latch_next = array('i')
+    
+    def _arrays(self):
+        return (self._type, self._left, self._right, self._latch_init, self._latch_next)
+    
+    @staticmethod
+    def from_arrays(arrays):
+        nodes = _Nodes()
+        nodes._type, nodes._left, nodes._right, nodes._latch_init, nodes._latch_next = arrays
+        return nodes
+    
+    def copy(self):
+        return _Nodes.from_arrays( [ _copy_array(a) for a in self._arrays() ] )
+    
+    def frozen(self):
+        """ return a copy of the nodes, stored in read-only memoryviews """
+        return _Nodes.from_arrays( [ _readonly(_copy_array(a)) for a in self._arrays() ] )
+    
+    def __len__(self):
+        return len(self._type)
+    
+    def __getitem__(self, i):
+        return _Node(self, i)
+    
+    def nbytes(self):
+        """ return the number of bytes used by the node arrays
+
+        Compared with one Python object with a __dict__ per node:
+
+        >>> class LegacyNode(object):
+        ...     def __init__(self, node_type, left=0, right=0):
+        ...         self._type = node_type
+        ...         self._left = left
+        ...         self._right = right
+        >>> aig = AIG()
+        >>> pis = [ aig.create_pi() for _ in xrange(100) ]
+        >>> ands = [ aig.create_and(a, b) for a, b in itertools.combinations(pis, 2) ]
+        >>> legacy = [ LegacyNode(_Node.AND, i, i) for i in xrange(len(aig)) ]
+        >>> legacy_nbytes = sys.getsizeof(legacy) + sum( sys.getsizeof(n) + sys.getsizeof(n.__dict__) for n in legacy )
+        >>> aig._nodes.nbytes() * 10 < legacy_nbytes
+        True
+        """
+        return sum( sys.getsizeof(a) for a in self._arrays() )
+    
+    # creation
+    
+    def append(self, node_type, left=0, right=0):
+        self._type.append(node_type)
+        self._left.append(left)
+        self._right.append(right)
+    
+    def append_latch(self, l_id, init, next):
+        self.append(_Node.LATCH, l_id, 0)
+        self._latch_init.append(init)
+        self._latch_next.append(_Nodes.NO_NEXT if next is None else next)
+    
+    def set_node(self, i, node_type, left, right):
+        self._type[i] = node_type
+        self._left[i] = left
+        self._right[i] = right
+    
+    # fanins
+    
+    def get_fanins(self, i):
+        t = self._type[i]
+        if t == _Node.AND:
+            return [self._left[i], self._right[i]]
+        elif t == _Node.BUFFER:
+            return [self._right[i]]
+        else:
+            return []
+    
+    def get_seq_fanins(self, i):
+        if self._type[i] == _Node.LATCH:
+            return [self.get_next(i)]
+        return self.get_fanins(i)
+    
+    # latches
+    
+    def get_init(self, i):
+        return self._latch_init[ self._left[i] ]
+    
+    def set_init(self, i, init):
+        self._latch_init[ self._left[i] ] = init
+    
+    def get_next(self, i):
+        next = self._latch_next[ self._left[i] ]
+        return None if next == _Nodes.NO_NEXT else next
+    
+    def set_next(self, i, f):
+        self._latch_next[ self._left[i] ] = _Nodes.NO_NEXT if f is None else f
+
+class _AIGBase(object):
+    """ The read-only part of the AIG interface, shared by AIG and FrozenAIG """
+
+    # the name tables can be filled on first use, by a '_load_names' function set instead of
+    # them, see aig_io.attach_aig() and aig_io.read_aiger(lazy_names=True)
+
+    _name_tables = ('_name_to_id', '_id_to_name', '_name_to_po', '_po_to_name')
 
-class AIG(object):
+    def __getattr__(self, attr):
+
+        load_names = self.__dict__.get('_load_names')
+
+        if attr in _AIGBase._name_tables and load_names is not None:
+            del self._load_names
+            load_names(self)
+            return getattr(self, attr)
+
+        raise AttributeError( "'%s' object has no attribute '%s'"%(type(self).__name__, attr) )
 
     # map AIG nodes to AIG nodes, take negation into account
 
@@ -229,31 +343,13 @@ class AIG(object):
     INIT_ONE = _Node.INIT_ONE
     INIT_NONDET = _Node.INIT_NONDET
 
-    def __init__(self, name=None, flat_name = (lambda n: n) ):
-        self._name = name
-        self._strash = {}
-        self._pis = []
-        self._latches = []
-        self._buffers = []
-        self._pos = []
-        self._justice = []
-        self._nodes = []
-        self._name_to_id = {}
-        self._id_to_name = {}
-        self._name_to_po = {}
-        self._po_to_name = {}
-        self._flat_name = flat_name
-        self._fanouts = {}
-        
-        self._nodes.append( _Node.make_const0() )
-
     def deref(self, f):
-        return self._nodes[ f>>1 ]
+        return _Node(self._nodes, f>>1)
     
     def name(self):
         return self._name
     
-    # Create basic objects
+    # Constants
     
     @staticmethod
     def get_const(c):
@@ -269,120 +365,8 @@ class AIG(object):
     def get_const1():
         return 1    
     
-    def create_pi(self, name=None):
-        pi_id = len(self._pis)
-        n = _Node.make_pi(pi_id)
-        fn = len(self._nodes)<<1
-        
-        self._nodes.append(n)
-        self._pis.append( fn )
-        
-        if name is not None:
-            self.set_name(fn, name)
-
-        return fn
-    
-    def create_latch(self, name=None, init=INIT_ZERO, next=None):
-        l_id = len(self._latches)
-        n = _Node.make_latch(l_id, init, next)
-        fn = len(self._nodes)<<1
-        
-        self._nodes.append(n)
-        self._latches.append( fn )
-
-        if name is not None:
-            self.set_name(fn, name)
-        
-        return fn
-
-    def create_and(self, left, right):
-        if left<right:
-            left, right = right, left
-        
-        if right==0:
-            return 0
-        
-        if right==1:
-            return left
-        
-        if left == right:
-            return right
-        
-        if left == (right ^ 1):
-            return 0
-        
-        key = (_Node.AND, left, right)
-        
-        if key in self._strash:
-            return self._strash[key]
-        
-        f = len(self._nodes)<<1
-        self._nodes.append( _Node.make_and(left, right) )
-        
-        self._strash[key] = f
-
-        return f
-        
-    def create_buffer(self, buf_in=0, name=None):
-        b_id = len(self._buffers)
-        f = len(self._nodes)<<1
-        
-        self._nodes.append( _Node.make_buffer(b_id, buf_in) )
-        self._buffers.append( f )
-        
-        if name is not None:
-            self.set_name(f, name)
-            
-        return f
-        
-    def convert_buf_to_pi(self, buf):
-        assert self.is_buffer(buf)
-        assert self.get_buf_in(buf) >= 0
-        
-        n = self.deref(buf)
-        self._buffers[n.get_buf_id()] = -1
-        n.convert_buf_to_pi(len(self._pis))
-        self._pis.append(buf)
-
-    def create_po(self, f=0, name=None, po_type=OUTPUT ):
-        po_id = len(self._pos)
-        self._pos.append( (f, po_type) )
-        
-        if name is not None:
-            self.set_po_name(po_id, name)
-        
-        return po_id
-        
-    def create_justice(self, po_ids):
-        po_ids = list(po_ids)
-
-        j_id = len(self._justice)
-
-        for po_id in po_ids:
-            assert self.get_po_type(po_id) == AIG.JUSTICE
-
-        self._justice.append( po_ids )
-
-        return j_id
-
-    def remove_justice(self):
-        
-        for po_ids in self._justice:
-            for po_id in po_ids:
-                self.set_po_type(po_id, AIG.OUTPUT)
-        
-        self._justice = []
-    
     # Names
     
-    def set_name(self, f, name):
-        assert not self.is_negated(f)
-        assert name not in self._name_to_id
-        assert f not in self._id_to_name
-
-        self._name_to_id[name] = f
-        self._id_to_name[f] = name
-        
     def get_id_by_name(self, name):
         return self._name_to_id[name]
     
@@ -395,44 +379,11 @@ class AIG(object):
     def get_name_by_id(self, f):
         return self._id_to_name[f]
 
-    def remove_name(self, f):
-        assert self.has_name(f)
-        name = self.get_name_by_id(f)
-
-        del self._id_to_name[f]
-        del self._name_to_id[name]
-
     def iter_names(self):
         return iteritems(self._id_to_name)
 
-    def fill_pi_names(self, replace=False, template="I_{}"):
-
-        if replace:
-            for pi in self.get_pis():
-                if self.has_name(pi):
-                    self.remove_name(pi)
-
-        uid = 0
-
-        for pi in self.get_pis():
-            if not self.has_name(pi):
-                while True:
-                    name = template.format(uid)
-                    uid += 1
-                    if not self.name_exists(name):
-                        break
-                self.set_name(pi, name)
-
     # PO names
     
-    def set_po_name(self, po, name):
-        assert 0 <= po < len(self._pos)
-        assert name not in self._name_to_po
-        assert po not in self._po_to_name
-        
-        self._name_to_po[name] = po
-        self._po_to_name[po] = name
-        
     def get_po_by_name(self, name):
         return self._name_to_po[name]
     
@@ -442,36 +393,12 @@ class AIG(object):
     def name_has_po(self, po):
         return po in self._name_to_po
 
-    def remove_po_name(self, po):
-        assert self.po_has_name(po)
-        name = self.get_name_by_po(po)
-        del self._name_to_po[name]
-        del self._po_to_name[po]
-    
     def get_name_by_po(self, po):
         return self._po_to_name[po]
 
     def iter_po_names(self):
         return ( (po_id, self.get_po_fanin(po_id), po_name) for po_id, po_name in iteritems(self._po_to_name) )
 
-    def fill_po_names(self, replace=False, template="O_{}"):
-
-        if replace:
-            self._name_to_po.clear()
-            self._po_to_name.clear()
-
-        po_names = set(name for _, _, name in self.iter_po_names())
-
-        uid = 0
-        for po_id, _, _ in self.get_pos():
-            if not self.po_has_name(po_id):
-                while True:
-                    name = template.format(uid)
-                    uid += 1
-                    if name not in po_names:
-                        break
-                self.set_po_name(po_id, name)
-
     # Query IDs
         
     @staticmethod
@@ -479,70 +406,51 @@ class AIG(object):
         return f >> 1
     
     def is_const0(self, f):
-        n = self.deref(f)
-        return n.is_const0()
+        return self._nodes._type[f>>1] == _Node.CONST0
     
     def is_pi(self, f):
-        n = self.deref(f)
-        return n.is_pi()
+        return self._nodes._type[f>>1] == _Node.PI
     
     def is_latch(self, f):
-        n = self.deref(f)
-        return n.is_latch()
+        return self._nodes._type[f>>1] == _Node.LATCH
     
     def is_and(self, f):
-        n = self.deref(f)
-        return n.is_and()
+        return self._nodes._type[f>>1] == _Node.AND
 
     def is_buffer(self, f):
-        n = self.deref(f)
-        return n.is_buffer()
+        return self._nodes._type[f>>1] == _Node.BUFFER
 
     # PIs
 
     def get_pi_by_id(self, pi_id):
         return self._pis[ pi_id ]
 
-    # Get/Set next for latches
-    
-    def set_init(self, l, init):
-        assert not self.is_negated(l)
-        assert self.is_latch(l)
-        n = self.deref(l)
-        n.set_init(init)
-    
-    def set_next(self, l, f):
-        assert not self.is_negated(l)
-        assert self.is_latch(l)
-        n = self.deref(l)
-        n.set_next(f)
+    # Latches
     
     def get_init(self, l):
         assert not self.is_negated(l)
         assert self.is_latch(l)
-        n = self.deref(l)
-        return n.get_init()
+        return self._nodes.get_init(l>>1)
 
     def get_next(self, l):
         assert not self.is_negated(l)
         assert self.is_latch(l)
-        n = self.deref(l)
-        return n.get_next()
+        return self._nodes.get_next(l>>1)
 
     # And gate
     
     def get_and_fanins(self, f):
         assert self.is_and(f)
-        n = self.deref(f)
-        return (n.get_left(), n.get_right())
+        i = f>>1
+        return (self._nodes._left[i], self._nodes._right[i])
 
     def get_and_left(self, f):
         assert self.is_and(f)
-        return self.deref(f).get_left()
+        return self._nodes._left[f>>1]
 
     def get_and_right(self, f):
         assert self.is_and(f)
-        return self.deref(f).get_right()
+        return self._nodes._right[f>>1]
 
     # Buffer
     
@@ -550,11 +458,6 @@ class AIG(object):
         n = self.deref(b)
         return n.get_buf_in()
     
-    def set_buf_in(self, b, f):
-        assert b>f
-        n = self.deref(b)
-        return n.set_buf_in(f)
-
     def get_buf_id(self, b):
         n = self.deref(b)
         return n.get_buf_id()
@@ -567,34 +470,23 @@ class AIG(object):
     # Fanins
     
     def get_fanins(self,f):
-        n = self.deref(f)
-        return n.get_fanins()
+        return self._nodes.get_fanins(f>>1)
     
     def get_positive_fanins(self,f):
-        n = self.deref(f)
-        return (self.get_positive(fi) for fi in n.get_fanins())
+        return (self.get_positive(fi) for fi in self._nodes.get_fanins(f>>1))
     
     def get_positive_seq_fanins(self,f):
-        n = self.deref(f)
-        return (self.get_positive(fi) for fi in n.get_seq_fanins())
+        return (self.get_positive(fi) for fi in self._nodes.get_seq_fanins(f>>1))
     
     # PO fanins
 
     def get_po_type(self, po):
-        assert 0 <= po < len(self._pos)
-        return self._pos[po][1]
+        assert 0 <= po < len(self._po_types)
+        return self._po_types[po]
     
     def get_po_fanin(self, po):
-        assert 0 <= po < len(self._pos)
-        return self._pos[po][0]
-    
-    def set_po_fanin(self, po, f):
-        assert 0 <= po < len(self._pos)
-        self._pos[po] = ( f, self._pos[po][1] )
-    
-    def set_po_type(self, po, po_type):
-        assert 0 <= po < len(self._pos)
-        self._pos[po] = ( self._pos[po][0], po_type )
+        assert 0 <= po < len(self._po_fanins)
+        return self._po_fanins[po]
     
     # Justice
     
@@ -602,12 +494,6 @@ class AIG(object):
         assert 0 <= j_id < len(self._justice)
         return ( po for po in self._justice[j_id] )
 
-    def set_justice_pos(self, j_id, po_ids):
-        assert 0 <= j_id < len(self._justice)
-        for po_id in po_ids:
-            assert self.get_po_type(po_id) == AIG.JUSTICE
-        self._justice[j_id] = po_ids
-    
     # Negation
     
     @staticmethod
@@ -640,57 +526,25 @@ class AIG(object):
     def negate_if_negated(f, c):
         return f ^ ( c & 1 )
     
-    # Higher-level boolean operations
+    # Object numbers
     
-    def create_nand(self, left, right):
-        return self.negate( self.create_and(left,right) )
-    
-    def create_or(self, left, right):
-        return self.negate( self.create_and(self.negate(left), self.negate(right)))
-
-    def create_nor(self, left, right):
-        return self.negate( self.create_or(left, right))
-
-    def create_xor(self, left, right):
-        return self.create_or( 
-                self.create_and( left, self.negate(right) ),
-                self.create_and( self.negate(left), right )
-            )
-        
-    def create_iff(self, left, right):
-        return self.negate( self.create_xor(left, right) )
-        
-    def create_implies(self, left, right):
-        return self.create_or(self.negate(left), right)
-    
-    def create_ite(self, f_if, f_then, f_else):
-        return self.create_or( 
-            self.create_and( f_if, f_then), 
-            self.create_and( self.negate(f_if), f_else) 
-            )
-
-    # Object numbers
-    
-    def n_pis(self):
-        return len(self._pis)
+    def n_pis(self):
+        return len(self._pis)
     
     def n_latches(self):
         return len(self._latches)
     
     def n_ands(self):
-        return self.n_nonterminals() - self.n_buffers()
+        return len(self._ands)
         
     def n_nonterminals(self):
         return len(self._nodes) - 1 - self.n_latches() - self.n_pis()
         
     def n_pos(self):
-        return len( self._pos )
+        return len( self._po_fanins )
         
     def n_pos_by_type(self, type):
-        res = 0
-        for _ in self.get_pos_by_type(type):
-            res += 1
-        return res
+        return len( self._pos_by_type.get(type, ()) )
         
     def n_justice(self):
         return len( self._justice )
@@ -707,7 +561,7 @@ class AIG(object):
         return ( (f, self.deref(f)) for f in self.construction_order() )
     
     def get_pis(self):
-        return  ( i<<1 for i, n in enumerate(self._nodes) if n.is_pi() )
+        return ( pi for pi in self._sorted_pis )
 
     def get_latches(self):
         return ( l for l in self._latches )
@@ -716,25 +570,29 @@ class AIG(object):
         return ( b for b in self._buffers if b>=0 )
     
     def get_and_gates(self):
-        return  ( i<<1 for i, n in enumerate(self._nodes) if n.is_and() )
+        return ( f for f in self._ands )
     
     def get_pos(self):
-        return ( (po_id, po_fanin, po_type) for po_id, (po_fanin, po_type) in enumerate(self._pos) )
+        return ( (po_id, po_fanin, po_type) for po_id, (po_fanin, po_type) in enumerate(zip(self._po_fanins, self._po_types)) )
 
     def get_pos_by_type(self, type):
-        return ( (po_id, po_fanin, po_type) for po_id, po_fanin, po_type in self.get_pos() if po_type==type )
+        po_ids = array('i', self._pos_by_type.get(type, ())) # copy, callers may change PO types while iterating
+        return ( (po_id, self._po_fanins[po_id], type) for po_id in po_ids )
         
     def get_po_fanins(self):
         return ( po for _,po,_ in self.get_pos() )
         
     def get_po_fanins_by_type(self, type):
-        return ( po for _,po,po_type in self.get_pos() if po_type==type)
+        return ( self._po_fanins[po_id] for po_id in self._pos_by_type.get(type, ()) )
         
     def get_justice_properties(self):
         return ( (i,po_ids) for i, po_ids in enumerate( self._justice ) )
             
     def get_nonterminals(self):
-        return ( i<<1 for i,n in enumerate(self._nodes) if n.is_nonterminal() )
+        buffers = [ b for b in self._buffers if b>=0 ]
+        if not buffers:
+            return ( f for f in self._ands )
+        return heapq.merge(self._ands, buffers)
             
     # Python special methods
     
@@ -822,7 +680,7 @@ class AIG(object):
             M[f] = af
 
         if pos is None:
-            pos = range(len(self._pos))
+            pos = range(self.n_pos())
         
         pos = set(pos)
 
@@ -868,124 +726,1269 @@ class AIG(object):
                 
         return aig
 
-    def compose(self, src, M, copy_pos=True):
-        """ rebuild the AIG 'src' inside 'self', connecting the two AIGs using 'M' """        
-        
-        for f in src.construction_order():
-            
-            if f in M:
-                continue
-                
-            n = src.deref(f)
-                
-            if n.is_pi():
-                M[f] = self.create_pi()
-                
-            elif n.is_and():
-                M[f] = self.create_and( M[n.get_left()], M[n.get_right()] )
-                
-            elif n.is_latch():
-                M[f] = self.create_latch(init=n.get_init())
-                
-            elif n.is_buffer():
-                M[f] = self.create_buffer()
-
-        for b in src.get_buffers():
-            self.set_buf_in(M[b], M[src.get_buf_in(b)])
-
-        for l in src.get_latches():
-            self.set_next(M[l], M[src.get_next(l)])
+    def build_fanouts(self):
+        """ build the fanout index, unless it is up to date with the current graph
 
-        if copy_pos:
-            for po_id, po_fanin, po_type in src.get_pos():
-                self.create_po( M[po_fanin], po_type=po_type )
+        The index is rebuilt after new nodes are created or existing ones are updated:
 
-    def cutpoint(self, f):
+        >>> aig = AIG()
+        >>> a, b = aig.create_pi(), aig.create_pi()
+        >>> g = aig.create_and(a, b)
+        >>> buf = aig.create_buffer(a)
+        >>> sorted( aig.get_fanouts([a]) ), aig.n_fanouts(b)
+        ([6, 8], 1)
+        >>> h = aig.create_and(g, AIG.negate(b))
+        >>> aig.set_buf_in(buf, b)
+        >>> sorted( aig.get_fanouts([a]) ), sorted( aig.get_fanouts([b]) ), aig.n_fanouts(g)
+        ([6], [6, 8, 10], 1)
+        >>> aig.build_fanouts()
+        >>> aig.build_fanouts()
+        >>> list( aig.get_fanout_csr()[1] )
+        [6, 6, 8, 10, 10]
+        """
         
-        assert self.is_buffer(f)
-        assert self.has_name(f)
+        state = (len(self._nodes), self._n_updates)
         
-        self.convert_buf_to_pi(f)
-
-    def build_fanouts(self):
+        if self._fanouts is not None and self._fanouts[0] == state:
+            return
         
-        for f in self.construction_order():
-
-            for g in self.get_positive_fanins(f):
-                
-                self._fanouts.setdefault(g, set()).add(f)
+        types = self._nodes._type
+        left = self._nodes._left
+        right = self._nodes._right
+        
+        N = len(types)
+        
+        nonterminals = list(self.get_nonterminals())
+        
+        # count the fanouts of each node
+        
+        offsets = array('i', [0]) * (N+1)
+        
+        for g in nonterminals:
+            i = g>>1
+            if types[i] == _Node.AND:
+                offsets[ (left[i]>>1) + 1 ] += 1
+            offsets[ (right[i]>>1) + 1 ] += 1
+        
+        for i in xrange(N):
+            offsets[i+1] += offsets[i]
+        
+        # fill the targets, sorted by construction order for each node
+        
+        targets = array('i', [0]) * offsets[N]
+        pos = array('i', offsets)
+        
+        for g in nonterminals:
+            i = g>>1
+            if types[i] == _Node.AND:
+                fi = left[i]>>1
+                targets[ pos[fi] ] = g
+                pos[fi] += 1
+            fi = right[i]>>1
+            targets[ pos[fi] ] = g
+            pos[fi] += 1
+        
+        self._fanouts = (state, offsets, targets)
+    
+    def get_fanout_csr(self):
+        """ return the combinational fanouts in compressed sparse row form, as a pair of arrays
+        (offsets, targets): the fanouts of node 'f' are targets[ offsets[f>>1] : offsets[(f>>1)+1] ] """
+        
+        self.build_fanouts()
+        
+        _, offsets, targets = self._fanouts
+        return offsets, targets
+    
+    def n_fanouts(self, f):
+        offsets, _ = self.get_fanout_csr()
+        i = f>>1
+        return offsets[i+1] - offsets[i]
     
     def get_fanouts(self, fs):
         
+        offsets, targets = self.get_fanout_csr()
+        
         res = set()
         
         for f in fs:
-            for fo in self._fanouts[f]:
-                res.add(fo)
+            i = f>>1
+            res.update( targets[ offsets[i] : offsets[i+1] ] )
               
         return res
 
-    def conjunction( self, fs ):
+    def get_tfo(self, roots, stop=[]):
+        """ return the combinational transitive fanout of 'roots', stop at 'stop' """
         
-        res = self.get_const1()
+        offsets, targets = self.get_fanout_csr()
         
-        for f in fs:
-            res = self.create_and( res, f )
+        visited = set()
         
-        return res
+        dfs_stack = list(roots)
         
-    def balanced_conjunction( self, fs ):
+        while dfs_stack:
+            
+            cur = self.get_positive(dfs_stack.pop())
+            
+            if cur in visited or cur in stop:
+                continue
+            
+            visited.add(cur)
+            
+            i = cur>>1
+            dfs_stack.extend( fo for fo in targets[ offsets[i] : offsets[i+1] ] if fo not in visited )
         
-        N = len(fs)
+        return sorted(visited)
+
+class _Checkpoint(object):
+    """ the sizes of the parts of an AIG when AIG.checkpoint() was called """
+    
+    __slots__ = ('n_nodes', 'n_latches', 'n_pis', 'n_buffers', 'n_ands', 'n_pos', 'n_justice', 'n_undo')
+
+class AIG(_AIGBase):
+
+    def __init__(self, name=None, flat_name = (lambda n: n) ):
+        self._name = name
+        self._strash = {}
+        self._strash_hits = 0
+        self._strash_misses = 0
+        self._pis = array('i')
+        self._latches = array('i')
+        self._buffers = array('i')
+        self._po_fanins = array('i')
+        self._po_types = array('b')
+        self._justice = []
+        self._nodes = _Nodes()
         
-        if N < 2:
-            return self.conjunction(fs)
+        # per-type indexes, kept sorted in construction order
         
-        return self.create_and( self.balanced_conjunction(fs[:N/2]), self.balanced_conjunction(fs[N/2:]) )
+        self._sorted_pis = array('i')
+        self._ands = array('i')
+        self._pos_by_type = {}
         
-    def disjunction (self, fs):
+        self._name_to_id = {}
+        self._id_to_name = {}
+        self._name_to_po = {}
+        self._po_to_name = {}
+        self._flat_name = flat_name
         
-        res = self.get_const0()
+        # in-place updates to existing nodes; together with the number of nodes, identifies
+        # the state of the graph for cached indexes such as the fanouts
         
-        for f in fs:
-            res = self.create_or( res, f )
+        self._n_updates = 0
+        self._fanouts = None
         
-        return res
+        # checkpoints, and the log of updates to the state older than the latest one, see checkpoint()
         
-    def balanced_disjunction( self, fs ):
+        self._checkpoints = []
+        self._undo = []
         
-        N = len(fs)
+        # the storage may be shared with copies of the AIG, and is copied on the first update, see copy()
         
-        if N < 2:
-            return self.disjunction(fs)
+        self._shared = False
+
+    def __getattr__(self, attr):
+
+        # the structural hashing table of an AIG thawed from a snapshot is built on first use
+
+        if attr == '_strash':
+            left = self._nodes._left
+            right = self._nodes._right
+            self._strash = { AIG._strash_key(left[f>>1], right[f>>1]):f for f in self._ands }
+            return self._strash
+
+        return _AIGBase.__getattr__(self, attr)
+
+    # Create basic objects
+    
+    def create_pi(self, name=None):
+        self._own()
+        pi_id = len(self._pis)
+        fn = len(self._nodes)<<1
         
-        return self.create_or( self.balanced_disjunction(fs[:N/2]), self.balanced_disjunction(fs[N/2:]) )
+        self._nodes.append(_Node.PI, pi_id)
+        self._pis.append( fn )
+        self._sorted_pis.append( fn )
+        
+        if name is not None:
+            self.set_name(fn, name)
 
-    def large_xor(self, fs):
+        return fn
+    
+    def create_latch(self, name=None, init=_AIGBase.INIT_ZERO, next=None):
+        self._own()
+        l_id = len(self._latches)
+        fn = len(self._nodes)<<1
+        
+        self._nodes.append_latch(l_id, init, next)
+        self._latches.append( fn )
 
-        res = self.get_const0()
+        if name is not None:
+            self.set_name(fn, name)
+        
+        return fn
 
-        for f in fs:
-            res = self.create_xor(res, f)
+    @staticmethod
+    def _strash_key(left, right):
+        # pack the (ordered) fanins of an AND gate into a single int, avoiding a tuple per gate
+        return (left << 32) | right
+
+    def create_and(self, left, right):
+        if left<right:
+            left, right = right, left
+        
+        if right==0:
+            return 0
+        
+        if right==1:
+            return left
+        
+        if left == right:
+            return right
+        
+        if left == (right ^ 1):
+            return 0
+        
+        key = AIG._strash_key(left, right)
+        
+        f = self._strash.get(key)
+        
+        if f is not None:
+            self._strash_hits += 1
+            return f
+        
+        self._strash_misses += 1
+        
+        if self._shared:
+            self._own()
+        
+        f = len(self._nodes)<<1
+        self._nodes.append(_Node.AND, left, right)
+        self._ands.append(f)
+        
+        self._strash[key] = f
+
+        return f
+
+    @staticmethod
+    def batch_result(k):
+        """ refer to the result of entry 'k' of the same create_ands() batch, can be negated with AIG.negate() """
+        return ~(k<<1)
+
+    def create_ands(self, lefts, rights):
+        """ create the AND gates of the literal pairs in 'lefts' and 'rights', return an array of the results
+
+        Same as calling create_and() on each pair, but without the per-gate method call overhead.
+        'lefts' and 'rights' can be any sequences of ints, including NumPy arrays, in which case
+        the result is a NumPy array. A negative entry, obtained from AIG.batch_result(k), refers
+        to the result of the earlier entry 'k' of the same batch.
+
+        >>> aig = AIG()
+        >>> a, b, c = aig.create_pi(), aig.create_pi(), aig.create_pi()
+        >>> list( aig.create_ands([a, b, AIG.batch_result(0), a], [b, a, AIG.negate(c), 1]) )
+        [8, 8, 10, 2]
+        >>> aig.create_and( aig.create_and(a, b), AIG.negate(c) )
+        10
+        """
+
+        self._own()
+
+        as_numpy = hasattr(lefts, 'dtype')
+
+        if hasattr(lefts, 'tolist'):
+            lefts = lefts.tolist()
+        if hasattr(rights, 'tolist'):
+            rights = rights.tolist()
+
+        res = array('i')
+
+        # the loop below inlines create_and(), keep the two in sync
+
+        strash = self._strash
+        append = res.append
+
+        # fanins of the new gates, added to the node arrays at the end
+
+        new_lefts = array('i')
+        new_rights = array('i')
+
+        n_nodes = len(self._nodes)
+        f = n_nodes<<1
+        hits = 0
+
+        try:
+
+            for left, right in zip(lefts, rights):
+
+                if left < 0:
+                    left = res[ (~left)>>1 ] ^ ( (~left)&1 )
+
+                if right < 0:
+                    right = res[ (~right)>>1 ] ^ ( (~right)&1 )
+
+                if left<right:
+                    left, right = right, left
+
+                if right==0 or left == (right ^ 1):
+                    append(0)
+                    continue
+
+                if right==1:
+                    append(left)
+                    continue
+
+                if left == right:
+                    append(right)
+                    continue
+
+                key = (left << 32) | right # AIG._strash_key()
+
+                g = strash.get(key)
+
+                if g is not None:
+                    hits += 1
+                    append(g)
+                    continue
+
+                new_lefts.append(left)
+                new_rights.append(right)
+
+                strash[key] = f
+                append(f)
+
+                f += 2
+
+        finally:
+
+            # also on error, so that the strash never refers to missing nodes
+
+            n_new = len(new_lefts)
+
+            self._nodes._type.extend( array('b', [_Node.AND]) * n_new )
+            self._nodes._left.extend(new_lefts)
+            self._nodes._right.extend(new_rights)
+            self._ands.extend( xrange(n_nodes<<1, f, 2) )
+
+            self._strash_hits += hits
+            self._strash_misses += n_new
+
+        if as_numpy:
+            import numpy
+            return numpy.frombuffer(res, dtype=numpy.int32)
 
         return res
 
-    def mux(self, select, args):
+    def _extend_strashed_ands(self, lefts, rights):
+        """ add the AND gates of the arrays 'lefts' and 'rights' as is, without simplification
+
+        The gates must be in the canonical form create_and() creates, with fanins that are existing
+        nodes or earlier gates of the batch. If one of them is a duplicate of another or of an existing
+        gate, nothing is added. Return whether the gates were added, as consecutive nodes.
+        """
+
+        n = len(lefts)
+        f = len(self._nodes)<<1
+
+        # the keys are AIG._strash_key(left, right)
+
+        keys = [ (left<<32)|right for left, right in zip(lefts, rights) ]
+        new = dict( zip(keys, xrange(f, f+2*n, 2)) )
+
+        if len(new) < n or ( self._strash and any( k in self._strash for k in keys ) ):
+            return False
+
+        self._own()
+
+        self._nodes._type.extend( array('b', [_Node.AND]) * n )
+        self._nodes._left.extend(lefts)
+        self._nodes._right.extend(rights)
+        self._ands.extend( xrange(f, f+2*n, 2) )
+
+        self._strash.update(new)
+        self._strash_misses += n
+
+        return True
         
-        res = []
+    def create_buffer(self, buf_in=0, name=None):
+        self._own()
+        b_id = len(self._buffers)
+        f = len(self._nodes)<<1
         
-        for col in zip(*args):
-            
-            f = self.disjunction( self.create_and(s,c) for s,c in zip(select,col) )
-            res.append( f )
+        self._nodes.append(_Node.BUFFER, b_id, buf_in)
+        self._buffers.append( f )
+        
+        if name is not None:
+            self.set_name(f, name)
             
-        return res
+        return f
+        
+    def convert_buf_to_pi(self, buf):
+        """ turn the buffer 'buf' into a new PI, which keeps its position among the PIs and nonterminals
+
+        >>> aig = AIG()
+        >>> a, b = aig.create_pi(), aig.create_pi()
+        >>> buf = aig.create_buffer( aig.create_and(a, b) )
+        >>> x = aig.create_pi()
+        >>> g = aig.create_and(buf, x)
+        >>> aig.convert_buf_to_pi(buf)
+        >>> list(aig.get_pis()), list(aig.get_nonterminals()), aig.n_pis(), aig.n_ands(), aig.n_nonterminals()
+        ([2, 4, 8, 10], [6, 12], 4, 2, 2)
+        """
+        self._own()
+        assert self.is_buffer(buf)
+        assert self.get_buf_in(buf) >= 0
+        
+        n = self.deref(buf)
+        if self._node_checkpointed(buf):
+            self._undo.append( (AIG._unconvert_buf_to_pi, (buf, n.get_buf_id(), n.get_buf_in())) )
+        self._n_updates += 1
+        self._buffers[n.get_buf_id()] = -1
+        n.convert_buf_to_pi(len(self._pis))
+        self._pis.append(buf)
+        bisect.insort(self._sorted_pis, buf)
 
-    def create_constraint(aig, f, name=None):
-        return aig.create_po(aig, f, name=name, po_type=AIG.CONSTRAINT)
+    def create_po(self, f=0, name=None, po_type=_AIGBase.OUTPUT ):
+        self._own()
+        po_id = len(self._po_fanins)
+        self._po_fanins.append(f)
+        self._po_types.append(po_type)
+        self._pos_by_type.setdefault(po_type, array('i')).append(po_id)
+        
+        if name is not None:
+            self.set_po_name(po_id, name)
+        
+        return po_id
+        
+    def create_justice(self, po_ids):
+        self._own()
+        po_ids = list(po_ids)
 
-    def create_property(aig, f, name=None):
+        j_id = len(self._justice)
+
+        for po_id in po_ids:
+            assert self.get_po_type(po_id) == AIG.JUSTICE
+
+        self._justice.append( po_ids )
+
+        return j_id
+
+    def remove_justice(self):
+        
+        for po_ids in self._justice:
+            for po_id in po_ids:
+                self.set_po_type(po_id, AIG.OUTPUT)
+        
+        if self._checkpoints:
+            self._undo.append( (AIG._restore_justice, (self._justice,)) )
+        
+        self._justice = []
+    
+    # Names
+    
+    def set_name(self, f, name):
+        self._own()
+        assert not self.is_negated(f)
+        assert name not in self._name_to_id
+        assert f not in self._id_to_name
+
+        if self._node_checkpointed(f):
+            self._undo.append( (AIG.remove_name, (f,)) )
+
+        self._name_to_id[name] = f
+        self._id_to_name[f] = name
+        
+    def remove_name(self, f):
+        self._own()
+        assert self.has_name(f)
+        name = self.get_name_by_id(f)
+
+        if self._node_checkpointed(f):
+            self._undo.append( (AIG.set_name, (f, name)) )
+
+        del self._id_to_name[f]
+        del self._name_to_id[name]
+
+    def fill_pi_names(self, replace=False, template="I_{}"):
+
+        if replace:
+            for pi in self.get_pis():
+                if self.has_name(pi):
+                    self.remove_name(pi)
+
+        uid = 0
+
+        for pi in self.get_pis():
+            if not self.has_name(pi):
+                while True:
+                    name = template.format(uid)
+                    uid += 1
+                    if not self.name_exists(name):
+                        break
+                self.set_name(pi, name)
+
+    # PO names
+    
+    def set_po_name(self, po, name):
+        self._own()
+        assert 0 <= po < len(self._po_fanins)
+        assert name not in self._name_to_po
+        assert po not in self._po_to_name
+        
+        if self._po_checkpointed(po):
+            self._undo.append( (AIG.remove_po_name, (po,)) )
+        
+        self._name_to_po[name] = po
+        self._po_to_name[po] = name
+        
+    def remove_po_name(self, po):
+        self._own()
+        assert self.po_has_name(po)
+        name = self.get_name_by_po(po)
+        if self._po_checkpointed(po):
+            self._undo.append( (AIG.set_po_name, (po, name)) )
+        del self._name_to_po[name]
+        del self._po_to_name[po]
+    
+    def fill_po_names(self, replace=False, template="O_{}"):
+
+        if replace:
+            for po_id in list(self._po_to_name):
+                self.remove_po_name(po_id)
+
+        po_names = set(name for _, _, name in self.iter_po_names())
+
+        uid = 0
+        for po_id, _, _ in self.get_pos():
+            if not self.po_has_name(po_id):
+                while True:
+                    name = template.format(uid)
+                    uid += 1
+                    if name not in po_names:
+                        break
+                self.set_po_name(po_id, name)
+
+    # Get/Set next for latches
+    
+    def set_init(self, l, init):
+        self._own()
+        assert not self.is_negated(l)
+        assert self.is_latch(l)
+        if self._node_checkpointed(l):
+            self._undo.append( (AIG.set_init, (l, self.get_init(l))) )
+        self._nodes.set_init(l>>1, init)
+    
+    def set_next(self, l, f):
+        self._own()
+        assert not self.is_negated(l)
+        assert self.is_latch(l)
+        if self._node_checkpointed(l):
+            self._undo.append( (AIG.set_next, (l, self.get_next(l))) )
+        self._n_updates += 1
+        self._nodes.set_next(l>>1, f)
+    
+    # Buffer
+    
+    def set_buf_in(self, b, f):
+        self._own()
+        assert b>f
+        n = self.deref(b)
+        if self._node_checkpointed(b):
+            self._undo.append( (AIG.set_buf_in, (b, n.get_buf_in())) )
+        self._n_updates += 1
+        return n.set_buf_in(f)
+
+    # PO fanins
+
+    def set_po_fanin(self, po, f):
+        self._own()
+        assert 0 <= po < len(self._po_fanins)
+        if self._po_checkpointed(po):
+            self._undo.append( (AIG.set_po_fanin, (po, self._po_fanins[po])) )
+        self._po_fanins[po] = f
+    
+    def set_po_type(self, po, po_type):
+        """ change the type of the PO 'po', which keeps its position among the POs of its new type
+
+        >>> aig = AIG()
+        >>> pos = [ aig.create_po(aig.create_pi(), po_type=t) for t in (AIG.OUTPUT, AIG.BAD_STATES, AIG.OUTPUT) ]
+        >>> aig.set_po_type(pos[2], AIG.BAD_STATES)
+        >>> aig.set_po_type(pos[0], AIG.CONSTRAINT)
+        >>> aig.n_pos_by_type(AIG.OUTPUT), aig.n_pos_by_type(AIG.BAD_STATES), aig.n_pos_by_type(AIG.CONSTRAINT)
+        (0, 2, 1)
+        >>> list(aig.get_pos_by_type(AIG.BAD_STATES)), list(aig.get_pos_by_type(AIG.CONSTRAINT))
+        ([(1, 4, 1), (2, 6, 1)], [(0, 2, 2)])
+        """
+        assert 0 <= po < len(self._po_types)
+        
+        old_type = self._po_types[po]
+        
+        if old_type == po_type:
+            return
+        
+        self._own()
+        
+        if self._po_checkpointed(po):
+            self._undo.append( (AIG.set_po_type, (po, old_type)) )
+        
+        old_ids = self._pos_by_type[old_type]
+        del old_ids[ bisect.bisect_left(old_ids, po) ]
+        
+        bisect.insort( self._pos_by_type.setdefault(po_type, array('i')), po )
+        
+        self._po_types[po] = po_type
+    
+    # Justice
+    
+    def set_justice_pos(self, j_id, po_ids):
+        self._own()
+        assert 0 <= j_id < len(self._justice)
+        for po_id in po_ids:
+            assert self.get_po_type(po_id) == AIG.JUSTICE
+        if self._checkpoints and j_id < self._checkpoints[-1].n_justice:
+            self._undo.append( (AIG.set_justice_pos, (j_id, self._justice[j_id])) )
+        self._justice[j_id] = po_ids
+    
+    # Higher-level boolean operations
+    
+    def create_nand(self, left, right):
+        return self.negate( self.create_and(left,right) )
+    
+    def create_or(self, left, right):
+        return self.negate( self.create_and(self.negate(left), self.negate(right)))
+
+    def create_nor(self, left, right):
+        return self.negate( self.create_or(left, right))
+
+    def create_xor(self, left, right):
+        return self.create_or( 
+                self.create_and( left, self.negate(right) ),
+                self.create_and( self.negate(left), right )
+            )
+        
+    def create_iff(self, left, right):
+        return self.negate( self.create_xor(left, right) )
+        
+    def create_implies(self, left, right):
+        return self.create_or(self.negate(left), right)
+    
+    def create_ite(self, f_if, f_then, f_else):
+        return self.create_or( 
+            self.create_and( f_if, f_then), 
+            self.create_and( self.negate(f_if), f_else) 
+            )
+
+    # Structural hashing statistics
+
+    def n_strash_hits(self):
+        """ number of create_and() calls that returned an existing AND gate. Calls with a constant
+        operand, equal operands or complementary operands are not counted, see n_strash_misses().
+
+        >>> aig = AIG()
+        >>> a, b = aig.create_pi(), aig.create_pi()
+        >>> g = aig.create_and(a, b)
+        >>> aig.create_and(b, a) == g, aig.create_and(a, a), aig.create_and(a, 0), aig.create_and(a, AIG.negate(a))
+        (True, 2, 0, 0)
+        >>> aig.n_strash_hits(), aig.n_strash_misses()
+        (1, 1)
+        >>> g2 = aig.create_and(a, AIG.negate(b))
+        >>> aig.n_strash_hits(), aig.n_strash_misses()
+        (1, 2)
+        """
+        return self._strash_hits
+
+    def n_strash_misses(self):
+        """ number of create_and() calls that created a new AND gate """
+        return self._strash_misses
+
+    def compose(self, src, M, copy_pos=True):
+        """ rebuild the AIG 'src' inside 'self', connecting the two AIGs using 'M' """        
+        
+        for f in src.construction_order():
+            
+            if f in M:
+                continue
+                
+            n = src.deref(f)
+                
+            if n.is_pi():
+                M[f] = self.create_pi()
+                
+            elif n.is_and():
+                M[f] = self.create_and( M[n.get_left()], M[n.get_right()] )
+                
+            elif n.is_latch():
+                M[f] = self.create_latch(init=n.get_init())
+                
+            elif n.is_buffer():
+                M[f] = self.create_buffer()
+
+        for b in src.get_buffers():
+            self.set_buf_in(M[b], M[src.get_buf_in(b)])
+
+        for l in src.get_latches():
+            self.set_next(M[l], M[src.get_next(l)])
+
+        if copy_pos:
+            for po_id, po_fanin, po_type in src.get_pos():
+                self.create_po( M[po_fanin], po_type=po_type )
+
+    def compact(self):
+        """ remove, in place, the nodes outside the sequential cone of the POs, and renumber the rest
+
+        The in-place alternative to clean(): one linear pass over the node arrays, using an extra
+        map of 4 bytes per node. Buffers, names and the relative order of the remaining nodes are
+        preserved. Return the map as an array 'M', indexed by old node id: the new literal of 'f'
+        is M[f>>1] ^ (f&1), and M[f>>1] is -1 if 'f' was removed. Not allowed while there are checkpoints.
+
+        >>> aig = AIG()
+        >>> a, b, c = aig.create_pi('a'), aig.create_pi('b'), aig.create_pi('c')
+        >>> unused = aig.create_and(a, c)
+        >>> po = aig.create_po( aig.create_and(AIG.negate(b), c) )
+        >>> M = aig.compact()
+        >>> list(M)
+        [0, -1, 2, 4, -1, 6]
+        >>> len(aig), aig.get_and_fanins( aig.get_po_fanin(po) ), aig.get_name_by_id(2)
+        (4, (4, 3), 'b')
+        """
+
+        assert not self._checkpoints, 'AIG.compact(): not allowed while there are checkpoints'
+
+        self._own()
+
+        nodes = self._nodes
+        types = nodes._type
+        left = nodes._left
+        right = nodes._right
+        latch_init = nodes._latch_init
+        latch_next = nodes._latch_next
+
+        N = len(types)
+
+        # mark the sequential cone of the POs, M[i] is 1 for nodes in the cone
+
+        M = array('i', [0]) * N
+        M[0] = 1
+
+        dfs_stack = [ f>>1 for f in self._po_fanins ]
+
+        while dfs_stack:
+
+            i = dfs_stack.pop()
+
+            if M[i]:
+                continue
+
+            M[i] = 1
+
+            t = types[i]
+
+            if t == _Node.AND:
+                dfs_stack.append( left[i]>>1 )
+                dfs_stack.append( right[i]>>1 )
+            elif t == _Node.BUFFER:
+                dfs_stack.append( right[i]>>1 )
+            elif t == _Node.LATCH:
+                next = latch_next[ left[i] ]
+                if next != _Nodes.NO_NEXT:
+                    dfs_stack.append( next>>1 )
+
+        # renumber the nodes in place, fanins of ANDs and buffers always precede them
+
+        pis = array('i')
+        latches = array('i')
+        buffers = array('i')
+        ands = array('i')
+
+        new_latch_next = array('i')
+        new_latch_init = array('b')
+
+        j = 1
+
+        for i in xrange(1, N):
+
+            if not M[i]:
+                M[i] = -1
+                continue
+
+            f = j<<1
+            M[i] = f
+
+            t = types[i]
+            types[j] = t
+
+            if t == _Node.AND:
+                l = left[i]
+                r = right[i]
+                left[j] = M[l>>1] ^ (l&1)
+                right[j] = M[r>>1] ^ (r&1)
+                ands.append(f)
+
+            elif t == _Node.PI:
+                left[j] = len(pis)
+                right[j] = 0
+                pis.append(f)
+
+            elif t == _Node.LATCH:
+                l_id = left[i]
+                new_latch_next.append( latch_next[l_id] )
+                new_latch_init.append( latch_init[l_id] )
+                left[j] = len(latches)
+                right[j] = 0
+                latches.append(f)
+
+            elif t == _Node.BUFFER:
+                r = right[i]
+                left[j] = len(buffers)
+                right[j] = M[r>>1] ^ (r&1)
+                buffers.append(f)
+
+            j += 1
+
+        M[0] = 0
+
+        for a in (types, left, right):
+            del a[j:]
+
+        for k, next in enumerate(new_latch_next):
+            if next != _Nodes.NO_NEXT:
+                new_latch_next[k] = M[next>>1] ^ (next&1)
+
+        nodes._latch_next = new_latch_next
+        nodes._latch_init = new_latch_init
+
+        self._pis = pis
+        self._sorted_pis = array('i', pis)
+        self._latches = latches
+        self._buffers = buffers
+        self._ands = ands
+
+        for po, f in enumerate(self._po_fanins):
+            self._po_fanins[po] = M[f>>1] ^ (f&1)
+
+        # rebuild the structural hashing table and the names
+
+        self._strash = {}
+
+        for f in ands:
+            i = f>>1
+            self._strash[ AIG._strash_key(left[i], right[i]) ] = f
+
+        id_to_name = self._id_to_name
+        self._id_to_name = {}
+        self._name_to_id = {}
+
+        for f, name in iteritems(id_to_name):
+            if M[f>>1] >= 0:
+                self.set_name( M[f>>1], name )
+
+        self._n_updates += 1
+
+        return M
+
+    # Copies
+
+    def copy(self):
+        """ return a copy of the AIG
+
+        The copy initially shares its storage with the original, and whichever of the two is
+        updated first copies it in bulk, so forking an AIG costs almost nothing until either
+        side changes. Checkpoints are not copied.
+
+        >>> aig = AIG()
+        >>> a, b = aig.create_pi('a'), aig.create_pi('b')
+        >>> po = aig.create_po( aig.create_and(a, b), name='o' )
+        >>> fork = aig.copy()
+        >>> fork.set_po_fanin(po, fork.create_and(a, AIG.negate(b)))
+        >>> aig.get_po_fanin(po), fork.get_po_fanin(po), len(aig), len(fork)
+        (6, 8, 4, 5)
+        """
+
+        aig = AIG.__new__(AIG)
+        aig.__dict__.update(self.__dict__)
+
+        aig._checkpoints = []
+        aig._undo = []
+
+        self._shared = aig._shared = True
+
+        return aig
+
+    def _own(self):
+        # copy the storage shared with copies of the AIG, before updating it
+
+        if not self._shared:
+            return
+
+        self._nodes = self._nodes.copy()
+
+        self._pis = _copy_array(self._pis)
+        self._latches = _copy_array(self._latches)
+        self._buffers = _copy_array(self._buffers)
+        self._po_fanins = _copy_array(self._po_fanins)
+        self._po_types = _copy_array(self._po_types)
+        self._justice = list(self._justice)
+
+        self._sorted_pis = _copy_array(self._sorted_pis)
+        self._ands = _copy_array(self._ands)
+        self._pos_by_type = { t:_copy_array(po_ids) for t, po_ids in iteritems(self._pos_by_type) }
+
+        # the structural hashing table and the names may not be built yet, see FrozenAIG.thaw()
+
+        if '_strash' in self.__dict__:
+            self._strash = self._strash.copy()
+
+        if '_load_names' not in self.__dict__:
+            self._name_to_id = self._name_to_id.copy()
+            self._id_to_name = self._id_to_name.copy()
+            self._name_to_po = self._name_to_po.copy()
+            self._po_to_name = self._po_to_name.copy()
+
+        self._shared = False
+
+    # Checkpoints
+
+    def checkpoint(self):
+        """ return a checkpoint of the current state, which rollback() can later restore
+
+        Checkpoints are cheap: creating nodes, POs and justice properties only appends to the AIG,
+        and the few in-place updates to older state (set_next(), set_po_type(), names, ...) are
+        logged. Rolling back takes time proportional to what was added or updated since.
+
+        >>> aig = AIG()
+        >>> a, b = aig.create_pi('a'), aig.create_pi('b')
+        >>> l = aig.create_latch('l')
+        >>> cp = aig.checkpoint()
+        >>> aig.set_next(l, aig.create_and(a, b))
+        >>> po = aig.create_po( aig.create_and(aig.create_pi('c'), l), name='o' )
+        >>> aig.rollback(cp)
+        >>> len(aig), aig.n_pos(), aig.get_next(l), aig.name_exists('c'), aig.create_and(a, b)
+        (4, 0, None, False, 8)
+
+        Names removed after the checkpoint can be reused by new nodes and POs:
+
+        >>> po = aig.create_po(a, name='o')
+        >>> cp = aig.checkpoint()
+        >>> aig.remove_name(a), aig.remove_po_name(po)
+        (None, None)
+        >>> c, po_c = aig.create_pi('a'), aig.create_po(b, name='o')
+        >>> aig.rollback(cp)
+        >>> aig.get_id_by_name('a'), aig.get_po_by_name('o'), len(aig), aig.n_pos()
+        (2, 0, 5, 1)
+
+        Rolling back past a later checkpoint also undoes the updates to the nodes created between
+        the two:
+
+        >>> cp1 = aig.checkpoint()
+        >>> c, d = aig.create_pi(), aig.create_pi('d')
+        >>> cp2 = aig.checkpoint()
+        >>> aig.set_name(c, 'c'), aig.remove_name(d)
+        (None, None)
+        >>> aig.rollback(cp1)
+        >>> len(aig), aig.name_exists('c'), aig.name_exists('d'), aig.get_id_by_name('a')
+        (5, False, False, 2)
+        """
+
+        cp = _Checkpoint()
+
+        cp.n_nodes = len(self._nodes)
+        cp.n_latches = len(self._latches)
+        cp.n_pis = len(self._pis)
+        cp.n_buffers = len(self._buffers)
+        cp.n_ands = len(self._ands)
+        cp.n_pos = len(self._po_fanins)
+        cp.n_justice = len(self._justice)
+        cp.n_undo = len(self._undo)
+
+        self._checkpoints.append(cp)
+
+        return cp
+
+    def rollback(self, cp):
+        """ restore the state saved by 'cp', which stays valid, while the checkpoints taken after it are discarded """
+
+        while self._checkpoints and self._checkpoints[-1] is not cp:
+            self._checkpoints.pop()
+
+        assert self._checkpoints, 'AIG.rollback(): unknown or discarded checkpoint'
+
+        self._own()
+
+        nodes = self._nodes
+        N = cp.n_nodes
+
+        # remove the names of the new nodes and POs first, the undo log may give them back to
+        # older nodes and POs
+
+        for i in xrange(N, len(nodes)):
+            name = self._id_to_name.pop(i<<1, None)
+            if name is not None:
+                del self._name_to_id[name]
+
+        for po in xrange(cp.n_pos, len(self._po_fanins)):
+            name = self._po_to_name.pop(po, None)
+            if name is not None:
+                del self._name_to_po[name]
+
+        # undo the logged updates, without logging them again. Updates logged for a later
+        # checkpoint may refer to nodes, POs and justice properties created after 'cp', which are
+        # removed anyway
+
+        checkpoints = self._checkpoints
+        self._checkpoints = []
+
+        try:
+            while len(self._undo) > cp.n_undo:
+                undo, args = self._undo.pop()
+                if undo in AIG._node_undo and args[0]>>1 >= N:
+                    continue
+                if undo in AIG._po_undo and args[0] >= cp.n_pos:
+                    continue
+                if undo == AIG.set_justice_pos and args[0] >= cp.n_justice:
+                    continue
+                undo(self, *args)
+        finally:
+            self._checkpoints = checkpoints
+
+        # remove the new AND gates from the structural hashing table
+
+        for k in xrange(cp.n_ands, len(self._ands)):
+            i = self._ands[k]>>1
+            del self._strash[ AIG._strash_key(nodes._left[i], nodes._right[i]) ]
+
+        # truncate
+
+        del nodes._type[N:]
+        del nodes._left[N:]
+        del nodes._right[N:]
+        del nodes._latch_init[cp.n_latches:]
+        del nodes._latch_next[cp.n_latches:]
+
+        del self._latches[cp.n_latches:]
+        del self._pis[cp.n_pis:]
+        del self._buffers[cp.n_buffers:]
+        del self._ands[cp.n_ands:]
+        del self._po_fanins[cp.n_pos:]
+        del self._po_types[cp.n_pos:]
+        del self._justice[cp.n_justice:]
+
+        del self._sorted_pis[ bisect.bisect_left(self._sorted_pis, N<<1): ]
+
+        for po_ids in self._pos_by_type.values():
+            del po_ids[ bisect.bisect_left(po_ids, cp.n_pos): ]
+
+        self._n_updates += 1
+
+    def drop_checkpoints(self):
+        """ discard all checkpoints, and stop logging updates for them """
+        self._checkpoints = []
+        self._undo = []
+
+    def _node_checkpointed(self, f):
+        return self._checkpoints and (f>>1) < self._checkpoints[-1].n_nodes
+
+    def _po_checkpointed(self, po):
+        return self._checkpoints and po < self._checkpoints[-1].n_pos
+
+    def _unconvert_buf_to_pi(self, buf, buf_id, buf_in):
+        self._nodes.set_node(buf>>1, _Node.BUFFER, buf_id, buf_in)
+        self._buffers[buf_id] = buf
+        del self._sorted_pis[ bisect.bisect_left(self._sorted_pis, buf) ]
+        self._n_updates += 1
+
+    def _restore_justice(self, justice):
+        self._justice = justice
+
+    # the undo log entries whose first argument is a node, or a PO
+
+    _node_undo = (set_name, remove_name, set_init, set_next, set_buf_in, _unconvert_buf_to_pi)
+    _po_undo = (set_po_name, remove_po_name, set_po_fanin, set_po_type)
+
+    def cutpoint(self, f):
+        
+        assert self.is_buffer(f)
+        assert self.has_name(f)
+        
+        self.convert_buf_to_pi(f)
+
+    def conjunction( self, fs ):
+        
+        res = self.get_const1()
+        
+        for f in fs:
+            res = self.create_and( res, f )
+        
+        return res
+        
+    def balanced_conjunction( self, fs ):
+        
+        N = len(fs)
+        
+        if N < 2:
+            return self.conjunction(fs)
+        
+        return self.create_and( self.balanced_conjunction(fs[:N/2]), self.balanced_conjunction(fs[N/2:]) )
+        
+    def disjunction (self, fs):
+        
+        res = self.get_const0()
+        
+        for f in fs:
+            res = self.create_or( res, f )
+        
+        return res
+        
+    def balanced_disjunction( self, fs ):
+        
+        N = len(fs)
+        
+        if N < 2:
+            return self.disjunction(fs)
+        
+        return self.create_or( self.balanced_disjunction(fs[:N/2]), self.balanced_disjunction(fs[N/2:]) )
+
+    def large_xor(self, fs):
+
+        res = self.get_const0()
+
+        for f in fs:
+            res = self.create_xor(res, f)
+
+        return res
+
+    def mux(self, select, args):
+        
+        res = []
+        
+        for col in zip(*args):
+            
+            f = self.disjunction( self.create_and(s,c) for s,c in zip(select,col) )
+            res.append( f )
+            
+        return res
+
+    def create_constraint(aig, f, name=None):
+        return aig.create_po(aig, f, name=name, po_type=AIG.CONSTRAINT)
+
+    def create_property(aig, f, name=None):
         return aig.create_po(aig, AIG.negate(f), name=name, po_type=AIG.BAD_STATES)
 
     def create_bad_states(aig, f, name=None):
         return aig.create_po(aig, f, name=name, po_type=AIG.BAD_STATES)
+
+    # Snapshots
+
+    def freeze(self):
+        """ return a read-only snapshot of the AIG, see FrozenAIG """
+        return FrozenAIG(self)
+
+class FrozenAIG(_AIGBase):
+    """ An immutable snapshot of an AIG.
+
+    The nodes, latches and POs are kept in contiguous read-only arrays, in construction order,
+    which is also a topological order. All the read-only AIG methods work on the snapshot, as
+    do the algorithms that only read an AIG, such as write_aiger(), write_cnf() and simulate().
+
+    >>> aig = AIG()
+    >>> a, b = aig.create_pi(), aig.create_pi()
+    >>> po = aig.create_po( aig.create_and(a, AIG.negate(b)), name='o' )
+    >>> frozen = aig.freeze()
+    >>> list(frozen.get_and_gates()), frozen.get_and_fanins(6), frozen.get_name_by_po(po)
+    ([6], (5, 2), 'o')
+    >>> list(frozen.types), list(frozen.fanins0), list(frozen.fanins1)
+    ([0, 1, 1, 3], [0, 0, 1, 5], [0, 0, 0, 2])
+    >>> frozen.create_pi()
+    Traceback (most recent call last):
+    ...
+    AttributeError: 'FrozenAIG' object has no attribute 'create_pi'
+    """
+
+    def __init__(self, aig=None):
+
+        self._n_updates = 0
+        self._fanouts = None
+
+        if aig is None:
+            # the fields are filled by a loader
+            return
+
+        self._name = aig._name
+        self._flat_name = aig._flat_name
+
+        self._nodes = aig._nodes.frozen()
+
+        self._pis = _readonly(_copy_array(aig._pis))
+        self._latches = _readonly(_copy_array(aig._latches))
+        self._buffers = _readonly(_copy_array(aig._buffers))
+        self._po_fanins = _readonly(_copy_array(aig._po_fanins))
+        self._po_types = _readonly(_copy_array(aig._po_types))
+        self._justice = tuple( tuple(po_ids) for po_ids in aig._justice )
+
+        self._sorted_pis = _readonly(_copy_array(aig._sorted_pis))
+        self._ands = _readonly(_copy_array(aig._ands))
+        self._pos_by_type = { t:_readonly(_copy_array(po_ids)) for t, po_ids in iteritems(aig._pos_by_type) }
+
+        self._name_to_id = dict(aig._name_to_id)
+        self._id_to_name = dict(aig._id_to_name)
+        self._name_to_po = dict(aig._name_to_po)
+        self._po_to_name = dict(aig._po_to_name)
+
+    def thaw(self):
+        """ return an AIG with the contents of the snapshot
+
+        Like AIG.copy(), the AIG shares the arrays of the snapshot and copies them on its first
+        update. Its structural hashing table is only built when it is first needed, for example
+        by create_and(), so an AIG loaded with aig_io.read_snapshot() is ready to use at once.
+
+        >>> aig = AIG()
+        >>> a, b = aig.create_pi(), aig.create_pi()
+        >>> po = aig.create_po( aig.create_and(a, b) )
+        >>> thawed = aig.freeze().thaw()
+        >>> thawed.create_and(b, a), thawed.create_and(a, AIG.negate(b)), len(aig), len(thawed)
+        (6, 8, 4, 5)
+        """
+
+        aig = AIG.__new__(AIG)
+        aig.__dict__.update(self.__dict__)
+
+        aig._justice = [ list(po_ids) for po_ids in self._justice ]
+        aig._pos_by_type = dict(self._pos_by_type)
+
+        aig._strash_hits = 0
+        aig._strash_misses = 0
+
+        aig._checkpoints = []
+        aig._undo = []
+
+        aig._shared = True
+
+        return aig
+
+    # Contiguous arrays, indexed by node id (f>>1), latch id and PO id respectively. For
+    # PIs, latches and buffers, fanins0 holds the PI, latch or buffer id, as in _Nodes.
+
+    @property
+    def types(self):
+        return self._nodes._type
+
+    @property
+    def fanins0(self):
+        return self._nodes._left
+
+    @property
+    def fanins1(self):
+        return self._nodes._right
+
+    @property
+    def latch_init(self):
+        return self._nodes._latch_init
+
+    @property
+    def latch_next(self):
+        return self._nodes._latch_next
+
+    @property
+    def po_fanins(self):
+        return self._po_fanins
+
+    @property
+    def po_types(self):
+        return self._po_types
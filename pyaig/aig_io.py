@@ -3,22 +3,39 @@
 # Author: Baruch Sterin <sterin@berkeley.edu>
 # Simple Python AIG readers and writers
 
+import importlib
 import io
-import re
+import itertools
+import numbers
+import os
+import struct
 import subprocess
+import sys
+import time
+import traceback
+
+from array import array
 
 from past.builtins import xrange
+from future.utils import iteritems
 
-from . aig import AIG
+from . aig import AIG, FrozenAIG, _Nodes
 
 class _aiger_writer(object):
+    """ Encodes an AIGER file into a buffer. If 'fout' is given, the buffer is written to it
+    whenever it reaches 'chunk_size' bytes, and by flush(). """
+
+    _format = b'aig'
 
-    def __init__(self, I, L, O, A, B, C, J, F):
+    def __init__(self, I, L, O, A, B, C, J, F, fout=None, chunk_size=None):
         
         self._bytes = bytearray()
+        
+        self._fout = fout
+        self._chunk_size = chunk_size if fout is not None and chunk_size is not None else sys.maxsize
 
         M = I+L+A
-        self._bytes.extend(b"aig %d %d %d %d %d"%(M,I,L,O,A))
+        self._bytes.extend(b"%s %d %d %d %d %d"%(self._format,M,I,L,O,A))
         
         if B+C+J+F > 0:
             self._bytes.extend(b" %d"%B )
@@ -49,6 +66,15 @@ class _aiger_writer(object):
     def get_bytes(self):
         return self._bytes
 
+    def flush(self):
+        if self._bytes:
+            self._fout.write(self._bytes)
+            self._bytes = bytearray()
+
+    def _flush_if_full(self):
+        if len(self._bytes) >= self._chunk_size:
+            self.flush()
+
     def write_inputs(self):
         pass
         
@@ -61,12 +87,16 @@ class _aiger_writer(object):
             self._bytes.extend(b"%d %d\n"%(next, self._next))
         
         self._next += 2
+        
+        self._flush_if_full()
     
     def write_po(self, po):
         self._bytes.extend(b"%d\n"%po)
+        self._flush_if_full()
     
     def write_justice_header(self, pos):
         self._bytes.extend(b"%d\n"%len(pos))
+        self._flush_if_full()
     
     def write_and(self, left, right):
         if left < right:
@@ -76,15 +106,20 @@ class _aiger_writer(object):
         self._encode( left - right )
 
         self._next += 2
+
+        self._flush_if_full()
     
     def write_input_name(self, i, name):
         self._bytes.extend(b"i%d %s\n"%(i, self._encode_str(name)))
+        self._flush_if_full()
     
     def write_latch_name(self, i, name):
         self._bytes.extend(b"l%d %s\n"%(i, self._encode_str(name)))
+        self._flush_if_full()
 
     def write_po_name(self, po_type, i, name):
         self._bytes.extend(b"%s%d %s\n"%(po_type, i, self._encode_str(name)))
+        self._flush_if_full()
 
     def _encode(self, x):
 
@@ -99,7 +134,53 @@ class _aiger_writer(object):
             return s
         return s.encode('utf-8')
 
-def write_aiger_file(aig, fout):
+class _aag_writer(_aiger_writer):
+    """ writes the ASCII AIGER format, where each input, latch and AND gate line starts with its literal """
+
+    _format = b'aag'
+
+    def write_inputs(self):
+        for i in xrange(1, self._I+1):
+            self._bytes.extend(b"%d\n"%(i<<1))
+            self._flush_if_full()
+
+    def write_latch(self, next, init):
+        self._bytes.extend(b"%d "%self._next)
+        _aiger_writer.write_latch(self, next, init)
+
+    def write_and(self, left, right):
+        if left < right:
+            left, right = right, left
+
+        self._bytes.extend(b"%d %d %d\n"%(self._next, left, right))
+
+        self._next += 2
+
+        self._flush_if_full()
+
+# the size of the chunks write_aiger_file() writes at once
+
+_WRITE_CHUNK_SIZE = 1<<20
+
+def write_aiger_file(aig, fout, ascii=False, chunk_size=_WRITE_CHUNK_SIZE):
+    """ write 'aig' to the file object 'fout', in chunks of about 'chunk_size' bytes as the file is
+    encoded, or all at once if 'chunk_size' is None. The chunk size does not change the output:
+
+    >>> aig = AIG()
+    >>> pis = [ aig.create_pi('i%d'%k) for k in range(8) ]
+    >>> l = aig.create_latch('l', init=AIG.INIT_NONDET)
+    >>> g = aig.conjunction( pis + [l] )
+    >>> aig.set_next(l, aig.create_xor(g, pis[0]))
+    >>> pos = [ aig.create_po(g, name='o'), aig.create_po(AIG.negate(g), po_type=AIG.BAD_STATES) ]
+    >>> j = aig.create_justice( [ aig.create_po(l, po_type=AIG.JUSTICE) ] )
+    >>> outputs = []
+    >>> for chunk_size in (1, 7, _WRITE_CHUNK_SIZE, None):
+    ...     f = io.BytesIO()
+    ...     _ = write_aiger_file(aig, f, chunk_size=chunk_size)
+    ...     outputs.append( f.getvalue() )
+    >>> all( out == flatten_aiger(aig) for out in outputs )
+    True
+    """
     
     map_aiger = {}
     
@@ -130,7 +211,7 @@ def write_aiger_file(aig, fout):
         else:
             return lit
     
-    writer = _aiger_writer(
+    writer = (_aag_writer if ascii else _aiger_writer)(
         aig.n_pis(), 
         aig.n_latches(), 
         aig.n_pos_by_type(AIG.OUTPUT), 
@@ -139,6 +220,8 @@ def write_aiger_file(aig, fout):
         aig.n_pos_by_type(AIG.CONSTRAINT), 
         aig.n_justice(),
         aig.n_pos_by_type(AIG.FAIRNESS), 
+        fout,
+        chunk_size
         )
         
     writer.write_inputs()
@@ -166,12 +249,12 @@ def write_aiger_file(aig, fout):
         writer.write_po(aiger_lit(po))      
     
     for g in aig.get_nonterminals():
-        n = aig.deref(g)
-        if n.is_buffer():
-            al = ar = aiger_lit( n.get_buf_in() )
+        if aig.is_buffer(g):
+            al = ar = aiger_lit( aig.get_buf_in(g) )
         else:
-            al = aiger_lit(n.get_left())
-            ar = aiger_lit(n.get_right())
+            left, right = aig.get_and_fanins(g)
+            al = aiger_lit(left)
+            ar = aiger_lit(right)
         writer.write_and(al, ar)
 
     # Write symbol table
@@ -210,17 +293,50 @@ def write_aiger_file(aig, fout):
         if aig.po_has_name(po_id):
             writer.write_po_name(b'f',i, aig.get_name_by_po(po_id) )
 
-    fout.write( writer.get_bytes() )
+    writer.flush()
 
     return map_aiger
 
 
-def write_aiger(aig, f):
+def write_aiger(aig, f, ascii=None):
+    """ write 'aig' to the file name or file object 'f', in the ASCII format if 'ascii' is
+    True, or if it is None and 'f' is a file name with the .aag extension. File names that
+    end with .gz, .bz2 or .xz, such as 'x.aig.gz', are compressed accordingly.
+
+    >>> import shutil, tempfile
+    >>> aig = AIG()
+    >>> po = aig.create_po( aig.create_and(aig.create_pi('a'), aig.create_pi('b')), name='o' )
+    >>> tmp = tempfile.mkdtemp()
+    >>> for name in ('x.aig.gz', 'x.aag.bz2'):
+    ...     path = os.path.join(tmp, name)
+    ...     _ = write_aiger(aig, path)
+    ...     with open(path, 'rb') as f:
+    ...         print( f.read(3), flatten_aiger(read_aiger(path)) == flatten_aiger(aig) )
+    b'\\x1f\\x8b\\x08' True
+    b'BZh' True
+    >>> shutil.rmtree(tmp)
+    """
+    
     if type(f) == str:
+        
+        base, ext = os.path.splitext(f)
+        codec = _compression_extensions.get(ext)
+        
+        if codec is None:
+            base = f
+        
+        if ascii is None:
+            ascii = base.endswith('.aag')
+            
         with open(f, "wb") as fout:
-            return write_aiger_file(aig, fout)
+            
+            if codec is None:
+                return write_aiger_file(aig, fout, ascii)
+            
+            with importlib.import_module(codec).open(fout, 'wb') as cout:
+                return write_aiger_file(aig, cout, ascii)
     else:
-        return write_aiger_file(aig, f)
+        return write_aiger_file(aig, f, bool(ascii))
 
 
 def flatten_aiger(aig):
@@ -342,12 +458,311 @@ def is_sat(aig):
     write_cnf(fout)
     fout.close()
 
-def read_aiger_file(fin):
+# the size of the chunks of the binary AND section read at once
+
+_READ_CHUNK_SIZE = 1<<20
+
+def _decode_aiger_ands(fin, first, A, chunk_size=_READ_CHUNK_SIZE):
+    """ decode the delta-encoded AND section of a binary AIGER file, read from 'fin' in chunks
+    of 'chunk_size' bytes
     
-    aig = AIG()
+    The AND gates are numbered from 'first'. Return the arrays of left (larger) and right fanin
+    literals, whether all gates are in the canonical form AIG.create_and() would create, so that
+    they can be added as is unless two of them are the same gate, and the bytes read past the end
+    of the section.
+
+    Gates and multi-byte deltas can span chunks:
+
+    >>> aig = AIG()
+    >>> pis = [ aig.create_pi() for _ in xrange(20) ]
+    >>> gates = [ aig.create_and(a, AIG.negate(b)) for a, b in itertools.combinations(pis, 2) ]
+    >>> aig.set_name(pis[0], 'x')
+    >>> fin = io.BytesIO( flatten_aiger(aig) )
+    >>> fin.readline()
+    b'aig 210 20 0 0 190\\n'
+    >>> lefts, rights, canonical, rest = _decode_aiger_ands(fin, 21, len(gates), chunk_size=11)
+    >>> list(lefts) == [ aig.get_and_left(g) for g in gates ], list(rights) == [ aig.get_and_right(g) for g in gates ]
+    (True, True)
+    >>> canonical, rest + fin.read()
+    (True, b'i0 x\\n')
+    """
+    
+    buf = bytearray()
+    pos = 0
+    
+    lefts = array('i')
+    rights = array('i')
+    
+    canonical = True
+    
+    g = first<<1
+    k = 0
+    
+    while k < A:
+        
+        chunk = fin.read(chunk_size)
+        
+        buf = buf[pos:] + chunk
+        pos = 0
+        
+        # a gate takes at most 10 bytes, decode the gates that are surely complete in the buffer
+        
+        n = min(A-k, len(buf)//10) if chunk else A-k
+        k += n
+        
+        # the varint decoding is inlined, most deltas fit in a single byte
+        
+        for _ in xrange(n):
+            
+            c = buf[pos]
+            pos += 1
+            d1 = c & 0x7F
+            shift = 7
+            while c & 0x80:
+                c = buf[pos]
+                pos += 1
+                d1 |= (c & 0x7F) << shift
+                shift += 7
+            
+            c = buf[pos]
+            pos += 1
+            d2 = c & 0x7F
+            shift = 7
+            while c & 0x80:
+                c = buf[pos]
+                pos += 1
+                d2 |= (c & 0x7F) << shift
+                shift += 7
+            
+            left = g - d1
+            right = left - d2
+            
+            # create_and() simplifies constant, equal and complementary fanins
+            
+            if canonical and ( right < 2 or d2 == 0 or (d2 == 1 and not right & 1) ):
+                canonical = False
+            
+            lefts.append(left)
+            rights.append(right)
+            
+            g += 2
+    
+    return lefts, rights, canonical, bytes(buf[pos:])
 
+def _iter_lines(head, fin):
+    """ iterate over the lines of the bytes 'head' followed by the rest of 'fin' """
+    
+    lines = head.split(b'\n')
+    last = lines.pop()
+    
+    for line in lines:
+        yield line
+        
+    for line in fin:
+        yield last + line
+        last = b''
+        
+    if last:
+        yield last
+
+def _add_aiger_ands(aig, first, lefts, rights, canonical):
+    """ create the AND gates with the fanins 'lefts' and 'rights', numbered from the literal 'first'
+    in topological order as in a binary AIGER file, return the literals of the gates. 'canonical'
+    tells whether all gates are in the form AIG.create_and() would create. 'lefts' and 'rights'
+    may be modified. """
+
+    n = len(lefts)
+
+    if canonical and aig._extend_strashed_ands(lefts, rights):
+        return xrange( first, first+2*n, 2 )
+
+    # the AND gates that refer to earlier AND gates are batch results, see AIG.create_ands()
+
+    for fanins in (lefts, rights):
+        for k, x in enumerate(fanins):
+            if x >= first:
+                fanins[k] = ~(x-first)
+
+    return aig.create_ands(lefts, rights)
+
+def _create_aiger_cone_ands(aig, vars, base, cone, lefts, rights):
+    """ create the AND gates of the sorted variables 'cone' of a binary AIGER file, whose gates are
+    numbered from 'base' and have the fanins 'lefts' and 'rights' """
+
+    # the fanins that are gates of the cone are batch results, see AIG.create_ands()
+
+    index = { v:j for j, v in enumerate(cone) }
+
+    def fanin(x):
+        v = x>>1
+        if v >= base:
+            return ~( (index[v]<<1) | (x&1) )
+        return vars[v] ^ (x&1)
+
+    ands = aig.create_ands( [ fanin(lefts[v-base]) for v in cone ], [ fanin(rights[v-base]) for v in cone ] )
+
+    for v, f in zip(cone, ands):
+        vars[v] = f
+
+def _create_ands_depth_first(aig, vars, ands):
+    """ create AND gates given as a list of (lhs, rhs0, rhs1) AIGER literal triplets, in any order
+
+    Unlike in the binary format, the gates of an ASCII AIGER file need not be in topological order.
+    'vars' maps the variables of the file to AIG literals, or None for the variables not created yet.
+    """
+
+    gates = { lhs>>1:(rhs0, rhs1) for lhs, rhs0, rhs1 in ands }
+
+    ON_STACK = -1
+
+    for lhs, _, _ in ands:
+
+        stack = [ lhs>>1 ]
+
+        while stack:
+
+            v = stack[-1]
+
+            if vars[v] is not None and vars[v] != ON_STACK:
+                stack.pop()
+                continue
+
+            vars[v] = ON_STACK
+
+            rhs0, rhs1 = gates[v]
+
+            for x in (rhs0, rhs1):
+                if vars[x>>1] is None:
+                    assert x>>1 in gates, 'read_aiger(): undefined literal %d'%x
+                    stack.append(x>>1)
+                    break
+                assert vars[x>>1] != ON_STACK, 'read_aiger(): cyclic AND gate %d'%(v<<1)
+            else:
+                stack.pop()
+                vars[v] = aig.create_and( vars[rhs0>>1]^(rhs0&1), vars[rhs1>>1]^(rhs1&1) )
+
+# the number of lines of the AND section of an ASCII AIGER file parsed at once
+
+_AAG_BATCH_SIZE = 1<<16
+
+# compressed files, detected by their magic bytes when reading, and by their extension when writing
+
+_compression_magic = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'lzma'),
+    )
+
+_compression_extensions = {
+    '.gz' : 'gzip',
+    '.bz2' : 'bz2',
+    '.xz' : 'lzma',
+    }
+
+def _peek(fin, n):
+    
+    if hasattr(fin, 'peek'):
+        return fin.peek(n)[:n]
+    
+    if hasattr(fin, 'seekable') and fin.seekable():
+        pos = fin.tell()
+        head = fin.read(n)
+        fin.seek(pos)
+        return head
+    
+    return b''
+
+def _decompressed(fin):
+    """ return a stream of the decompressed contents of 'fin' if it starts with a known compression header, otherwise 'fin' """
+    
+    head = _peek(fin, 6)
+    
+    for magic, codec in _compression_magic:
+        if head.startswith(magic):
+            return importlib.import_module(codec).open(fin, 'rb')
+    
+    return fin
+
+def _parse_latch(tokens):
+    
+    next = int(tokens[0])
+    init = AIG.INIT_ZERO
+    
+    # the initial value is 0, 1, or the latch literal itself for an uninitialized latch
+    
+    if len(tokens)==2:
+        
+        if tokens[1] == b'0':
+            init = AIG.INIT_ZERO
+        elif tokens[1] == b'1':
+            init = AIG.INIT_ONE
+        else:
+            init = AIG.INIT_NONDET
+            
+    return (next, init)
+
+def read_aiger_file(fin, pos=None, lazy_names=False):
+    """ read a binary (aig) or ASCII (aag) AIGER file, depending on its header, possibly compressed with gzip, bzip2 or xz
+    
+    If 'pos' is given, only its POs, a list of PO indices or names, are created, together with
+    their sequential cone. PO indices are in the order the POs are created when 'pos' is None:
+    outputs, bad states, constraints, justice and fairness POs. A justice property is kept if
+    all its POs are, whether they are selected by index or by the name of the property. For a
+    structurally hashed file, such as one written from an AIG, this is the same as
+    AIG.clean(pos=pos, justice_pos=[]) on the whole AIG, except that clean() drops the justice
+    properties. Otherwise, the cone is that of the file, and may keep PIs and latches that only
+    feed gates which structural hashing removes:
+
+    >>> aig = AIG()
+    >>> a, b, c = aig.create_pi('a'), aig.create_pi('b'), aig.create_pi('c')
+    >>> l = aig.create_latch('l')
+    >>> aig.set_next(l, aig.create_and(l, AIG.negate(c)))
+    >>> x = aig.create_po( aig.create_and(a, b), name='x' )
+    >>> y = aig.create_po( aig.create_and(b, l), name='y', po_type=AIG.BAD_STATES )
+    >>> j = aig.create_justice( [ aig.create_po(a, po_type=AIG.JUSTICE) ] )
+    >>> f = io.BytesIO()
+    >>> _ = write_aiger(aig, f)
+    >>> full = read_aiger( io.BytesIO(f.getvalue()) )
+    >>> cone = read_aiger( io.BytesIO(f.getvalue()), pos=['y'] )
+    >>> flatten_aiger(cone) == flatten_aiger( full.clean(pos=[y], justice_pos=[]) ), cone.n_pis()
+    (True, 2)
+    >>> read_aiger( io.BytesIO(f.getvalue()), pos=[2] ).n_justice(), full.clean(pos=[2], justice_pos=[]).n_justice()
+    (1, 0)
+    
+    If 'lazy_names' is True, the symbol table is only parsed on the first use of the names.
+
+    ASCII files round-trip:
+
+    >>> aig = AIG()
+    >>> a, b = aig.create_pi('a'), aig.create_pi('b')
+    >>> l = aig.create_latch('l', init=AIG.INIT_ONE)
+    >>> aig.set_next(l, aig.create_and(a, AIG.negate(l)))
+    >>> po = aig.create_po( aig.create_and(aig.create_and(a, b), l), name='o' )
+    >>> f = io.BytesIO()
+    >>> _ = write_aiger(aig, f, ascii=True)
+    >>> f.getvalue()
+    b'aag 6 2 1 1 3\\n2\\n4\\n6 8 1\\n12\\n8 7 2\\n10 4 2\\n12 10 6\\ni0 a\\ni1 b\\nl0 l\\no0 o\\n'
+    >>> flatten_aiger( read_aiger(io.BytesIO(f.getvalue())) ) == flatten_aiger(aig)
+    True
+
+    and their variables can be numbered in any order, with gates that refer to later gates:
+
+    >>> aag = b'aag 5 2 1 1 2\\n10\\n4\\n6 8 1\\n2\\n2 8 5\\n8 10 6\\ni0 a\\ni1 b\\no0 o\\n'
+    >>> aig = AIG()
+    >>> a, b = aig.create_pi('a'), aig.create_pi('b')
+    >>> l = aig.create_latch(init=AIG.INIT_ONE)
+    >>> aig.set_next(l, aig.create_and(a, l))
+    >>> po = aig.create_po( aig.create_and(aig.get_next(l), AIG.negate(b)), name='o' )
+    >>> flatten_aiger( read_aiger(io.BytesIO(aag)) ) == flatten_aiger(aig)
+    True
+    """
+    
+    fin = _decompressed(fin)
+    
     header = fin.readline().split()
-    assert header[0] == b'aig'
+    assert header[0] in (b'aig', b'aag')
+
+    aag = header[0] == b'aag'
     
     args = [ int(t) for t in header[1:] ]
     (M,I,L,O,A) = args[:5]
@@ -357,232 +772,536 @@ def read_aiger_file(fin):
     J = args[7] if len(args)>7 else 0
     F = args[8] if len(args)>8 else 0
    
-    vars = []
-    nexts = []
+    if aag:
+        lines = iter(fin)
+        readline = lambda: next(lines)
+    else:
+        readline = fin.readline
     
-    pos_output = []
-    pos_bad_states = []
-    pos_constraint = []
-    pos_justice = []
-    pos_fairness = []
+    # the file is first parsed into variables and literals, which are then turned into an AIG
     
-    vars.append( aig.get_const0() )
+    if aag:
+        pi_vars = [ int(readline())>>1 for _ in xrange(I) ]
+    else:
+        pi_vars = list( xrange(1, I+1) )
     
-    for i in xrange(I):
-        vars.append( aig.create_pi() )
-        
-    def parse_latch(line):
+    latch_vars = []
+    nexts = []
         
-        tokens = line.strip().split(b' ')
+    for i in xrange(L):
         
-        next = int(tokens[0])
-        init = 0
+        tokens = readline().split()
         
-        if len(tokens)==2:
+        if aag:
+            latch_vars.append( int(tokens[0])>>1 )
+            tokens = tokens[1:]
+        else:
+            latch_vars.append( I+1+i )
             
-            if tokens[1] == '0':
-                init = AIG.INIT_ZERO
-            if tokens[1] == '1':
-                init = AIG.INIT_ONE
-            else:
-                init = AIG.INIT_NONDET
-                
-        return (next, init)
-        
-    for i in xrange(L):
-        vars.append( aig.create_latch() )
-        nexts.append( parse_latch(fin.readline() ) )
+        nexts.append( _parse_latch(tokens) )
+
+    pos_output = [ int(readline()) for _ in xrange(O) ]
+    pos_bad_states = [ int(readline()) for _ in xrange(B) ]
+    pos_constraint = [ int(readline()) for _ in xrange(C) ]
 
-    for i in xrange(O):
-        pos_output.append( int( fin.readline() ) )
+    n_j_pos = [ int(readline()) for _ in xrange(J) ]
+    pos_justice = [ [ int(readline()) for _ in xrange(n) ] for n in n_j_pos ]
 
-    for i in xrange(B):
-        pos_bad_states.append( int( fin.readline() ) )
+    pos_fairness = [ int(readline()) for _ in xrange(F) ]
 
-    for i in xrange(C):
-        pos_constraint.append( int( fin.readline() ) )
+    first = (I+L+1)<<1
 
-    n_j_pos = []
+    if aag:
 
-    for i in xrange(J):
-        n_j_pos.append( int(fin.readline()) )
+        # the AND section is parsed in batches of lines
         
-    for n in n_j_pos:
-        pos = []
-        for i in xrange(n):
-            pos.append( int( fin.readline() ) )
-        pos_justice.append(pos)
+        ands = array('i')
+        
+        for k in xrange(0, A, _AAG_BATCH_SIZE):
+            n = min(A-k, _AAG_BATCH_SIZE)
+            ands.extend( map( int, b' '.join( itertools.islice(lines, n) ).split() ) )
+        
+        lhs, lefts, rights = ands[0::3], ands[1::3], ands[2::3]
 
-    for i in xrange(F):
-        pos_fairness.append( int( fin.readline() ) )
+        symbols = lines
 
-    def decode():
+    else:
 
-        i = 0
-        res = 0
+        lefts, rights, canonical, rest = _decode_aiger_ands(fin, I+L+1, A)
 
-        while True:
+        symbols = _iter_lines(rest, fin)
 
-            c = ord(fin.read(1))
+    # the POs to create, and their sequential cone
+    
+    po_types = [AIG.OUTPUT]*O + [AIG.BAD_STATES]*B + [AIG.CONSTRAINT]*C + [AIG.JUSTICE]*sum(n_j_pos) + [AIG.FAIRNESS]*F
+    po_fanins = pos_output + pos_bad_states + pos_constraint + [ f for j_pos in pos_justice for f in j_pos ] + pos_fairness
+    
+    keep = None
+    
+    if pos is not None:
+        
+        symbols = list(symbols)
+        
+        selected = set( _select_aiger_pos(pos, symbols, (O, B, C, n_j_pos)) )
+        
+        # the gates of a binary file are numbered from 'base'
+
+        base = first>>1
+
+        latch_of = { v:l for l, v in enumerate(latch_vars) }
+        and_of = { f>>1:k for k, f in enumerate(lhs) } if aag else None
+        
+        keep = bytearray(M+1)
+        cone = []
+        
+        stack = [ po_fanins[po]>>1 for po in selected ]
+        push = stack.append
+        
+        while stack:
             
-            res |= ( (c&0x7F) << (7*i) )
+            v = stack.pop()
             
-            if (c&0x80)==0:
-                break
+            if keep[v]:
+                continue
             
-            i += 1
+            keep[v] = 1
+            cone.append(v)
+            
+            k = and_of.get(v) if aag else ( v - base if v >= base else None )
+            
+            if k is not None:
+                push( lefts[k]>>1 )
+                push( rights[k]>>1 )
+                
+            elif v in latch_of:
+                push( nexts[latch_of[v]][0]>>1 )
     
-        return res
+    aig = AIG()
+    
+    vars = [None] * (M+1)
+    vars[0] = aig.get_const0()
+    
+    pis = [ None ] * I
+    latches = [ None ] * L
+    
+    for i, v in enumerate(pi_vars):
+        if keep is None or keep[v]:
+            pis[i] = vars[v] = aig.create_pi()
+        
+    for i, v in enumerate(latch_vars):
+        if keep is None or keep[v]:
+            latches[i] = vars[v] = aig.create_latch()
+        
+    if keep is not None:
+        
+        cone.sort()
+        
+        if aag:
+            ands = [ (lhs[and_of[v]], lefts[and_of[v]], rights[and_of[v]]) for v in cone if v in and_of ]
+            _create_ands_depth_first( aig, vars, ands )
+        else:
+            _create_aiger_cone_ands( aig, vars, base, [ v for v in cone if v >= base ], lefts, rights )
     
+    else:
+        
+        if aag:
+            
+            # files numbered like the binary format, with the AND gates in topological order, are
+            # read the same way, otherwise the gates are created in depth-first order
+            
+            numbered = vars[:first>>1] == list( xrange(0, first, 2) ) and lhs == array( 'i', xrange(first, first+2*A, 2) )
+            
+            canonical = numbered and all( l > r0 > r1 > 1 and r0 != r1^1 for l, r0, r1 in zip(lhs, lefts, rights) )
+            topological = canonical or numbered and all( l > r0 and l > r1 for l, r0, r1 in zip(lhs, lefts, rights) )
+            
+        else:
+            topological = True
+                
+        if not topological:
+            _create_ands_depth_first( aig, vars, list(zip(lhs, lefts, rights)) )
+            
+        else:
+            vars[first>>1:(first>>1)+A] = _add_aiger_ands(aig, first, lefts, rights, canonical)
+
     def lit(x):
         return aig.negate_if( vars[x>>1], x&0x1)
     
-    for i in xrange(I+L+1, I+L+A+1):
-        d1 = decode()
-        d2 = decode()
-        g = i<<1
-        vars.append( aig.create_and( lit(g-d1), lit(g-d1-d2) ) )
-                     
-    for l, v in enumerate(xrange(I+1,I+L+1)):
-        aig.set_init( vars[v], nexts[l][1] )
-        aig.set_next( vars[v], lit(nexts[l][0]) )
+    for l, (f, init) in zip(latches, nexts):
+        if l is not None:
+            aig.set_init( l, init )
+            aig.set_next( l, lit(f) )
+    
+    po_ids = [ None ] * len(po_fanins)
+    
+    for po, (f, po_type) in enumerate( zip(po_fanins, po_types) ):
+        if keep is None or po in selected:
+            po_ids[po] = aig.create_po( lit(f), po_type=po_type )
+    
+    j_po = O+B+C
+    justice_pos = []
+    
+    for n in n_j_pos:
+        j_ids = po_ids[ j_po : j_po+n ]
+        if None not in j_ids:
+            aig.create_justice( j_ids )
+        justice_pos.append( j_ids[0] if j_ids else None )
+        j_po += n
+    
+    # the names of the PIs and latches, and of the POs, by symbol type
+    
+    node_symbols = { b'i':pis, b'l':latches }
+    
+    po_symbols = {
+        b'o' : po_ids[ : O ],
+        b'b' : po_ids[ O : O+B ],
+        b'c' : po_ids[ O+B : O+B+C ],
+        b'j' : justice_pos,
+        b'f' : po_ids[ len(po_ids)-F : ],
+        }
+    
+    def load_names(aig):
+        
+        # as in set_name() and set_po_name(), a name already used by another object is dropped
         
-    output_pos = []
+        name_to_id = aig._name_to_id = {}
+        id_to_name = aig._id_to_name = {}
+        name_to_po = aig._name_to_po = {}
+        po_to_name = aig._po_to_name = {}
         
-    for po in pos_output:
-        output_pos.append( aig.create_po( lit(po), po_type=AIG.OUTPUT ) )
+        for kind, i, name in _iter_symbols(symbols):
+            
+            targets = node_symbols.get(kind)
+            
+            if targets is not None:
+                f = targets[i]
+                if f is not None and name not in name_to_id and f not in id_to_name:
+                    name_to_id[name] = f
+                    id_to_name[f] = name
+                continue
+            
+            targets = po_symbols.get(kind)
+            
+            if targets is not None:
+                po = targets[i]
+                if po is not None and name not in name_to_po and po not in po_to_name:
+                    name_to_po[name] = po
+                    po_to_name[po] = name
     
-    bad_states_pos = []
+    if lazy_names:
         
-    for po in pos_bad_states:
-        bad_states_pos.append( aig.create_po( lit(po), po_type=AIG.BAD_STATES ) )
+        # only keep the lines of the symbol table, which are parsed on the first name lookup
         
-    constraint_pos = []
+        symbols = list(symbols)
         
-    for po in pos_constraint:
-        constraint_pos.append( aig.create_po( lit(po), po_type=AIG.CONSTRAINT ) )
+        for table in AIG._name_tables:
+            delattr(aig, table)
         
-    for pos in pos_justice:
-        po_ids = [ aig.create_po( lit(po), po_type=AIG.JUSTICE ) for po in pos ]
-        aig.create_justice( po_ids )
-
-    fairness_pos = []
+        aig._load_names = load_names
         
-    for po in pos_fairness:
-        fairness_pos.append( aig.create_po( lit(po), po_type=AIG.FAIRNESS ) )
+    else:
+        load_names(aig)
         
-    names = set()
-    po_names = set()
+    return aig
 
-    for line in fin:
-        m = re.match( b'i(\\d+) (.*)', line )
-        if m:
-            if m.group(2) not in names:
-                aig.set_name( vars[int(m.group(1))+1], m.group(2))
-                names.add(m.group(2))
-            continue
+def _iter_symbols(lines):
+    """ iterate over the (type, index, name) entries of the symbol table 'lines', up to the comment section """
+    
+    for line in lines:
         
-        m = re.match( b'l(\\d+) (.*)', line )
-        if m:
-            if m.group(2) not in names:
-                aig.set_name( vars[I+int(m.group(1))+1], m.group(2))
-                names.add(m.group(2))
-            continue
+        sp = line.find(b' ')
         
-        m = re.match( b'o(\\d+) (.*)', line )
-        if m:
-            if m.group(2) not in po_names:
-                aig.set_po_name( output_pos[int(m.group(1))], m.group(2))
-                po_names.add(m.group(2))
+        if sp < 2:
+            if line.rstrip(b'\r\n') == b'c':
+                return
             continue
         
-        m = re.match( b'b(\\d+) (.*)', line )
-        if m:
-            if m.group(2) not in po_names:
-                aig.set_po_name( bad_states_pos[int(m.group(1))], m.group(2))
-                po_names.add(m.group(2))
-            continue
+        index = line[1:sp]
         
-        m = re.match( b'c(\\d+) (.*)', line )
-        if m:
-            if m.group(2) not in po_names:
-                aig.set_po_name( constraint_pos[int(m.group(1))], m.group(2))
-                po_names.add(m.group(2))
+        if not index.isdigit():
             continue
         
-        m = re.match( b'f(\\d+) (.*)', line )
-        if m:
-            if m.group(2) not in po_names:
-                aig.set_po_name( fairness_pos[int(m.group(1))], m.group(2))
-                po_names.add(m.group(2))
+        name = line[sp+1:]
+        
+        if name[-1:] == b'\n':
+            name = name[:-1]
+        
+        yield line[:1], int(index), name
+
+
+def _select_aiger_pos(pos, symbols, counts):
+    """ return the PO indices of 'pos', a list of PO indices or names, given the symbol table and the number
+    of outputs, bad states, constraints and POs of each justice property. The name of a justice property
+    selects all its POs. """
+    
+    O, B, C, n_j_pos = counts
+    
+    j_offsets = [ O+B+C ]
+    for n in n_j_pos:
+        j_offsets.append( j_offsets[-1] + n )
+    
+    offsets = { b'o':0, b'b':O, b'c':O+B, b'f':j_offsets[-1] }
+    
+    po_by_name = {}
+    
+    for kind, i, name in _iter_symbols(symbols):
+        if kind in offsets:
+            po_by_name.setdefault( name, [ offsets[kind] + i ] )
+        elif kind == b'j':
+            po_by_name.setdefault( name, range( j_offsets[i], j_offsets[i+1] ) )
+    
+    for po in pos:
+        
+        if isinstance(po, numbers.Integral):
+            yield po
             continue
         
-    return aig
+        if not isinstance(po, bytes):
+            po = po.encode('utf-8')
+            
+        assert po in po_by_name, 'read_aiger(): no PO named %r'%po
+        
+        for po_id in po_by_name[po]:
+            yield po_id
+
+
+def read_aiger(f, pos=None, lazy_names=False):
+    """ read the AIGER file name or file object 'f', see read_aiger_file()
+
+    The name of a justice property is the name of its first PO:
+
+    >>> aig = AIG()
+    >>> a = aig.create_pi('a')
+    >>> po = aig.create_po(a, name='live', po_type=AIG.JUSTICE)
+    >>> j = aig.create_justice( [ po, aig.create_po(AIG.negate(a), po_type=AIG.JUSTICE) ] )
+    >>> f = io.BytesIO()
+    >>> _ = write_aiger(aig, f)
+    >>> f.getvalue()
+    b'aig 1 1 0 0 0 0 0 1\\n2\\n2\\n3\\ni0 a\\nj0 live\\n'
+    >>> read_aiger( io.BytesIO(f.getvalue()) ).get_name_by_po(po)
+    b'live'
 
+    With lazy_names=True, the names are parsed on their first use:
+
+    >>> lazy = read_aiger( io.BytesIO(f.getvalue()), lazy_names=True )
+    >>> '_name_to_id' in lazy.__dict__
+    False
+    >>> lazy.get_id_by_name(b'a'), lazy.get_name_by_po(po), '_name_to_id' in lazy.__dict__
+    (2, b'live', True)
+    >>> flatten_aiger(lazy) == f.getvalue()
+    True
+    """
 
-def read_aiger(f):
     if type(f) == str:
         with open(f, "rb") as fin:
-            return read_aiger_file(fin)
+            return read_aiger_file(fin, pos, lazy_names)
     else:
-        return read_aiger_file(f)
+        return read_aiger_file(f, pos, lazy_names)
 
 
 def unflatten_aiger(buf):
     return read_aiger_file(io.BytesIO(buf))
 
 
-def marshal_aiger(aig):
+# the bytes that do not end a varint
+
+_VARINT_CONTINUATION = bytes( bytearray( xrange(0x80, 0x100) ) )
+
+def _skip_varints(fin, n):
+    """ read past the next 'n' varints of 'fin', return the bytes read after them """
+    
+    buf = b''
+    
+    while n > 0:
+        
+        buf = fin.read(_READ_CHUNK_SIZE)
+        assert buf, 'aiger_info(): unexpected end of file'
+        
+        # the last byte of each varint is below 0x80
+        
+        ends = len( buf.translate(None, _VARINT_CONTINUATION) )
+        
+        if ends < n:
+            n -= ends
+            continue
+        
+        # narrow down to the part of the chunk with the n-th end
+        
+        lo, hi = 0, len(buf)
+        
+        while hi - lo > 64:
+            mid = (lo + hi) // 2
+            ends = len( buf[lo:mid].translate(None, _VARINT_CONTINUATION) )
+            if ends < n:
+                n -= ends
+                lo = mid
+            else:
+                hi = mid
+        
+        for i, c in enumerate( bytearray(buf[lo:hi]), lo ):
+            if c < 0x80:
+                n -= 1
+                if n == 0:
+                    return buf[i+1:]
+    
+    return buf
+
+def aiger_info(f, names=False):
+    """ return the header counts of the AIGER file name or file object 'f', without building the AIG
+
+    The result is a dict with the format, b'aig' or b'aag', and the counts M, I, L, O, A, B, C, J
+    and F. If 'names' is True, the dict also maps 'names' to the symbol table, as a dict from the
+    symbol type, b'i', b'l', b'o', b'b', b'c', b'j' or b'f', to a dict from index to name. The AND
+    gates are skipped without decoding them.
+
+    >>> aig = AIG()
+    >>> a, b = aig.create_pi('a'), aig.create_pi()
+    >>> po = aig.create_po( aig.create_and(a, b), name='o' )
+    >>> info = aiger_info( io.BytesIO( flatten_aiger(aig) ), names=True )
+    >>> info['I'], info['O'], info['A'], info['B'], info['names'][b'i'], info['names'][b'o']
+    (2, 1, 1, 0, {0: b'a'}, {0: b'o'})
+    """
+    
+    if type(f) == str:
+        with open(f, "rb") as fin:
+            return aiger_info(fin, names)
+    
+    fin = _decompressed(f)
+    
+    header = fin.readline().split()
+    assert header[0] in (b'aig', b'aag')
+    
+    args = [ int(t) for t in header[1:] ]
+    args.extend( [0] * (9-len(args)) )
+    
+    info = dict( zip( ('M', 'I', 'L', 'O', 'A', 'B', 'C', 'J', 'F'), args ) )
+    info['format'] = header[0]
+    
+    if not names:
+        return info
+    
+    M, I, L, O, A, B, C, J, F = args
+    
+    aag = header[0] == b'aag'
+    
+    def skip_lines(n):
+        for _ in itertools.islice(fin, n):
+            pass
+    
+    skip_lines( (I if aag else 0) + L + O + B + C )
+    
+    n_justice_pos = sum( int(line) for line in itertools.islice(fin, J) )
+    
+    skip_lines( n_justice_pos + F )
+    
+    if aag:
+        skip_lines(A)
+        lines = fin
+    else:
+        lines = _iter_lines( _skip_varints(fin, 2*A), fin )
+    
+    symbols = { t:{} for t in (b'i', b'l', b'o', b'b', b'c', b'j', b'f') }
+    
+    for kind, i, name in _iter_symbols(lines):
+        if kind in symbols:
+            symbols[kind][i] = name
+    
+    info['names'] = symbols
+    
+    return info
 
-    data = bytearray()
 
-    def putu(x):
+def _encode_varints(values, out=None):
+    """ append the unsigned LEB128 encoding of the non-negative integers 'values' to the bytearray
+    'out' and return it
+    
+    >>> bytes( _encode_varints([0, 1, 127, 128, 300]) )
+    b'\\x00\\x01\\x7f\\x80\\x01\\xac\\x02'
+    """
+    
+    if out is None:
+        out = bytearray()
+    
+    append = out.append
+    
+    for x in values:
         while x >= 0x80:
-            data.append( x&0x7F | 0x80 )
+            append( x&0x7F | 0x80 )
             x >>= 7
-        data.append(x)
+        append(x)
+    
+    return out
 
-    M = AIG.fmap(negate_if_negated=lambda f, c: f^c)
+def _decode_varints(data):
+    """ decode the buffer 'data', a sequence of unsigned LEB128 integers, into an array
+    
+    'data' can be any object that supports the buffer protocol, it is read through a memoryview
+    without copying. An incomplete integer at the end is ignored.
+    
+    >>> list( _decode_varints(b'\\x00\\x01\\x7f\\x80\\x01\\xac\\x02') )
+    [0, 1, 127, 128, 300]
+    """
+    
+    values = array('q')
+    append = values.append
+    
+    x = 0
+    shift = 0
+    
+    for c in memoryview(data).cast('B'):
+        if c < 0x80:
+            append( x | (c << shift) )
+            x = 0
+            shift = 0
+        else:
+            x |= (c & 0x7F) << shift
+            shift += 7
+    
+    return values
 
-    # Constants
+def marshal_aiger(aig):
+
+    # the marshaled literal of literal 'f' is M[f], the constant is the negation of variable 1
 
     n_const = 2
-    M[ AIG.get_const1() ] = 2
 
-    # PIs
+    pis = list( aig.get_pis() )
+    latches = list( aig.get_latches() )
+    ands = list( aig.get_and_gates() )
 
-    n_pis = aig.n_pis()
-    putu(n_pis)
+    n_pis = len(pis)
+    n_latches = len(latches)
+    n_ands = len(ands)
 
-    for i, pi in enumerate(aig.get_pis()):
-        M[ pi ] = (n_const + i) << 1
+    vars = array('q', [-1]) * len(aig._nodes)
+    vars[0] = 3
 
-    # Latches
+    for f, x in zip( itertools.chain(pis, latches, ands), xrange(n_const<<1, (n_const+n_pis+n_latches+n_ands)<<1, 2) ):
+        vars[f>>1] = x
 
-    n_latches = aig.n_latches()
-    putu(n_latches)
+    M = array('q', [0]) * (2*len(vars))
+    M[0::2] = vars
+    M[1::2] = array( 'q', [ x^1 for x in vars ] )
 
-    for i, ll in enumerate(aig.get_latches()):
-        M[ ll ] = (n_const + n_pis + i) << 1
+    def lits(fs):
+        return list( map(M.__getitem__, fs) )
 
-    # Gates
-
-    n_ands = aig.n_ands()   
-    putu(n_ands)
+    values = array('q', [n_pis, n_latches, n_ands])
 
-    for i, f in enumerate(aig.get_and_gates()):
+    # Gates
 
-        putu( M[ aig.get_and_right(f) ] << 1)
-        putu( M[ aig.get_and_left(f) ] )
+    ids = [ f>>1 for f in ands ]
 
-        M[ f ] = (n_const + n_pis + n_latches + i) << 1
+    gates = array('q', [0]) * (2*n_ands)
+    gates[0::2] = array( 'q', [ x<<1 for x in lits( map(aig._nodes._right.__getitem__, ids) ) ] )
+    gates[1::2] = array( 'q', lits( map(aig._nodes._left.__getitem__, ids) ) )
+    
+    values.extend(gates)
 
     # Latches
 
     V = { AIG.INIT_NONDET:0, AIG.INIT_ZERO:2, AIG.INIT_ONE:3 }
     
-    for ll in aig.get_latches():
-        putu( (M[ aig.get_next(ll) ] << 2) | V[ aig.get_init(ll) ] )
+    values.extend( (x<<2) | V[ aig.get_init(ll) ] for ll, x in zip(latches, lits( aig.get_next(ll) for ll in latches )) )
 
     # Properties
 
@@ -596,144 +1315,536 @@ def marshal_aiger(aig):
     if len(bad_pos) == 0 and len(justice_properties)==0 and len(output_pos) > 0:
         bad_pos = output_pos
 
-    putu( len(bad_pos) )
-    for po_id, po_fanin, po_type in bad_pos:
-        putu( M[po_fanin] ^ 1 )
+    values.append( len(bad_pos) )
+    values.extend( x^1 for x in lits( po_fanin for _, po_fanin, _ in bad_pos ) )
 
     # Fairness
 
-    putu(1)
+    values.append(1)
 
     total = len(justice_pos) + len(justice_properties) * (len(fairness_pos) + 1)
-    putu(total)
-
-    for i, po_ids in justice_properties:
+    values.append(total)
 
-        for po_id in po_ids:
-            putu( M[ aig.get_po_fanin(po_id) ] )
+    fairness = lits( po_fanin for _, po_fanin, _ in fairness_pos )
 
-        for po_id, po_fanin, po_type in fairness_pos:
-            putu( M[po_fanin] )
-
-        putu(0)
+    for i, po_ids in justice_properties:
+        values.extend( lits( aig.get_po_fanin(po_id) for po_id in po_ids ) )
+        values.extend( fairness )
+        values.append(0)
 
     # Constraints
 
-    putu( len(constraint_pos) )
-    for po_id, po_fanin, po_type in constraint_pos:
-        putu( M[po_fanin] )
-
-    return data
-
-
-class archive(object):
-
-    def __init__(self, data):
-        
-        self.data = data
-        self.pos = 0
-
-    def get_next(self):
+    values.append( len(constraint_pos) )
+    values.extend( lits( po_fanin for _, po_fanin, _ in constraint_pos ) )
 
-        c = self.data[ self.pos ]
-        self.pos += 1
+    # nodes that are not marshaled, such as buffers, are still -1
 
-        return c
+    assert not values or min(values) >= 0
 
-    def getu(self):
-        
-        x = 0
-        shift = 0
-        while True:
-            c = self.get_next()
-            x |= ( c & 0x7F ) << shift
-            shift += 7
-            if c < 0x80:
-                return x
-
-
-class ifmap(object):
-    
-    def __init__(self):
-        self.m = {}
-        
-    def __getitem__(self, i):
-        return AIG.negate_if(self.m[ i & ~1 ], i&1)
-        
-    def __setitem__(self, i, f):
-        self.m[ i & ~1 ] = AIG.negate_if(f, i&1)
+    return _encode_varints(values)
 
 
 def unmarshal_aiger(data):
 
-    a = archive(data)
+    values = _decode_varints(data)
 
     aig = AIG()
-    M = ifmap()
 
-    # Constants
+    n_pis, n_latches, n_ands = values[0:3]
+    k = 3
 
-    n_const = 2
-    M[ 2 ] = AIG.get_const1()
+    # PIs and Latches
+
+    for i in xrange(n_pis):
+        aig.create_pi()
 
-    # PIs
+    for i in xrange(n_latches):
+        aig.create_latch()
 
-    n_pis = a.getu()
+    # Gates, the marshaled literals of PIs, latches and gates added as consecutive nodes are 2
+    # higher than the literals of the nodes, and 2 and 3 are the constants
 
-    for i in xrange(n_pis):
-        M[ (n_const + i) << 1 ] = aig.create_pi()
+    first = len(aig._nodes)<<1
 
-    # Latches
+    def fanins(us):
+        return array( 'i', [ x-2 if x >= 4 else x^3 for x in us ] )
 
-    n_latches = a.getu()
+    rights = fanins( u>>1 for u in values[k:k+2*n_ands:2] )
+    lefts = fanins( values[k+1:k+2*n_ands:2] )
+    k += 2*n_ands
 
-    for i in xrange(n_latches):
-        M[ (n_const + n_pis + i) << 1 ] = aig.create_latch()
+    canonical = all( g > l > r > 1 and r != l^1 for g, l, r in zip(xrange(first, first+2*n_ands, 2), lefts, rights) )
 
-    # Gates
+    gates = _add_aiger_ands(aig, first, lefts, rights, canonical)
 
-    n_ands = a.getu()
+    base = (first>>1) + 1
 
-    for i in xrange(n_ands):
-        f0 = M[ a.getu() >> 1 ]
-        f1 = M[ a.getu() ]
-        M[ (n_const + n_pis + n_latches + i) << 1 ] = aig.create_and(f0, f1)
+    def lit(x):
+        v = x>>1
+        assert v > 0
+        if v >= base:
+            return gates[v-base] ^ (x&1)
+        return x-2 if v > 1 else x^3
     
     # Latches
 
     V = { 0:AIG.INIT_NONDET, 2:AIG.INIT_ZERO, 3:AIG.INIT_ONE }
 
-    for ll in aig.get_latches():
-        u = a.getu()
+    for ll, u in zip(list(aig.get_latches()), values[k:k+n_latches]):
         aig.set_init(ll, V[ u & 3])
-        aig.set_next(ll, M[ u >> 2 ])
+        aig.set_next(ll, lit( u >> 2 ))
+    k += n_latches
 
     # Properties
 
-    n_props = a.getu()
-    for i in xrange(n_props):
-        aig.create_po(M[ a.getu() ^ 1 ], po_type=AIG.BAD_STATES)
+    n_props = values[k]
+    for u in values[k+1:k+1+n_props]:
+        aig.create_po(lit( u ^ 1 ), po_type=AIG.BAD_STATES)
+    k += 1 + n_props
 
     # Liveness
 
-    fair_version = a.getu()
+    fair_version = values[k]
     assert fair_version == 1
 
-    fair_total = a.getu()
+    fair_total = values[k+1]
     cur_justice = []
 
-    for i in xrange(fair_total):
-        u = a.getu()
+    for u in values[k+2:k+2+fair_total]:
         if u > 0:
-            cur_justice.append( aig.create_po(M[u], po_type=AIG.JUSTICE) )
+            cur_justice.append( aig.create_po(lit(u), po_type=AIG.JUSTICE) )
         else:
             aig.create_justice(cur_justice)
             cur_justice = []
+    k += 2 + fair_total
 
     # Constraints
 
-    n_constr = a.getu()
-    for i in xrange(n_constr):
-        aig.create_po(M[ a.getu() ^ 1 ], po_type=AIG.CONSTRAINT)
+    n_constr = values[k]
+    for u in values[k+1:k+1+n_constr]:
+        aig.create_po(lit( u ^ 1 ), po_type=AIG.CONSTRAINT)
 
     return aig
+
+
+# Snapshot layout: the arrays of an AIG, each aligned to a cache line, preceded by a header
+# that lists the (typecode, offset, count) of each section. A FrozenAIG can be attached to
+# such a buffer without copying or parsing the arrays.
+
+_SNAPSHOT_MAGIC = b'PYAIGSNP'
+_SNAPSHOT_VERSION = 1
+_SNAPSHOT_ALIGN = 64
+
+_snapshot_header = struct.Struct('<8sIII')
+_snapshot_section = struct.Struct('<c7xQQ')
+
+_snapshot_sections = (
+    ('types', 'b'),
+    ('fanins0', 'i'),
+    ('fanins1', 'i'),
+    ('latch_init', 'b'),
+    ('latch_next', 'i'),
+    ('pis', 'i'),
+    ('latches', 'i'),
+    ('buffers', 'i'),
+    ('po_fanins', 'i'),
+    ('po_types', 'b'),
+    ('sorted_pis', 'i'),
+    ('ands', 'i'),
+    ('po_type_keys', 'i'),
+    ('po_type_offsets', 'q'),
+    ('po_type_ids', 'i'),
+    ('justice_offsets', 'q'),
+    ('justice_ids', 'i'),
+    ('name_ids', 'i'),
+    ('name_kinds', 'b'),
+    ('name_offsets', 'q'),
+    ('name_blob', 'B'),
+    ('po_name_ids', 'i'),
+    ('po_name_kinds', 'b'),
+    ('po_name_offsets', 'q'),
+    ('po_name_blob', 'B'),
+)
+
+
+def _concat_groups(groups):
+    """ concatenate the sequences in 'groups', return (offsets, values) """
+    offsets = array('q', [0])
+    values = array('i')
+    for g in groups:
+        values.extend(g)
+        offsets.append(len(values))
+    return offsets, values
+
+
+def _encode_names(items):
+    """ encode an iterable of (id, name) pairs, str names are stored as utf-8 """
+    ids = array('i')
+    kinds = array('b')
+    offsets = array('q', [0])
+    blob = bytearray()
+    for i, name in items:
+        ids.append(i)
+        if isinstance(name, bytes):
+            kinds.append(1)
+            blob.extend(name)
+        else:
+            kinds.append(0)
+            blob.extend(name.encode('utf-8'))
+        offsets.append(len(blob))
+    return ids, kinds, offsets, blob
+
+
+def _decode_names(ids, kinds, offsets, blob):
+    blob = blob.tobytes()
+    for k in xrange(len(ids)):
+        name = blob[ offsets[k] : offsets[k+1] ]
+        yield ids[k], name if kinds[k] else name.decode('utf-8')
+
+
+def _snapshot_arrays(aig):
+    """ return the sections of the snapshot of 'aig' (an AIG or a FrozenAIG) """
+
+    nodes = aig._nodes
+
+    po_type_keys = sorted(aig._pos_by_type)
+    po_type_offsets, po_type_ids = _concat_groups( aig._pos_by_type[t] for t in po_type_keys )
+    justice_offsets, justice_ids = _concat_groups( aig._justice )
+
+    return (
+        nodes._type, nodes._left, nodes._right, nodes._latch_init, nodes._latch_next,
+        aig._pis, aig._latches, aig._buffers, aig._po_fanins, aig._po_types,
+        aig._sorted_pis, aig._ands,
+        array('i', po_type_keys), po_type_offsets, po_type_ids,
+        justice_offsets, justice_ids,
+        ) + _encode_names( iteritems(aig._id_to_name) ) + _encode_names( iteritems(aig._po_to_name) )
+
+
+def _snapshot_layout(arrays):
+    """ return the total size of the snapshot and the (offset, nbytes) of each section """
+
+    layout = []
+    pos = _snapshot_header.size + _snapshot_section.size * len(arrays)
+
+    for a in arrays:
+        pos = (pos + _SNAPSHOT_ALIGN - 1) & ~(_SNAPSHOT_ALIGN - 1)
+        nbytes = memoryview(a).nbytes
+        layout.append( (pos, nbytes) )
+        pos += nbytes
+
+    return pos, layout
+
+
+def _write_snapshot_header(arrays, layout, buf):
+    """ write the header of the snapshot into the writable buffer 'buf' """
+
+    byteorder = 0 if sys.byteorder == 'little' else 1
+    _snapshot_header.pack_into(buf, 0, _SNAPSHOT_MAGIC, _SNAPSHOT_VERSION, byteorder, len(arrays))
+
+    for k, ( (_, typecode), a, (offset, nbytes) ) in enumerate(zip(_snapshot_sections, arrays, layout)):
+        pos = _snapshot_header.size + k * _snapshot_section.size
+        _snapshot_section.pack_into(buf, pos, typecode.encode('ascii'), offset, len(a))
+
+
+def _write_snapshot(arrays, layout, buf):
+    """ write the snapshot sections into the writable buffer 'buf' """
+
+    buf = memoryview(buf).cast('B')
+
+    _write_snapshot_header(arrays, layout, buf)
+
+    for a, (offset, nbytes) in zip(arrays, layout):
+        buf[ offset : offset+nbytes ] = memoryview(a).cast('B')
+
+
+def _load_snapshot(buf):
+    """ return a FrozenAIG whose arrays are read-only views into 'buf'
+
+    >>> aig = AIG()
+    >>> po = aig.create_po( aig.create_and(aig.create_pi(), aig.create_pi()) )
+    >>> arrays = _snapshot_arrays(aig)
+    >>> size, layout = _snapshot_layout(arrays)
+    >>> buf = bytearray(size)
+    >>> _write_snapshot(arrays, layout, buf)
+    >>> _load_snapshot(buf).n_ands()
+    1
+    >>> _load_snapshot(buf[:-1])
+    Traceback (most recent call last):
+    ...
+    ValueError: truncated pyaig snapshot
+    >>> buf[_snapshot_header.size] = ord('?')
+    >>> _load_snapshot(buf)
+    Traceback (most recent call last):
+    ...
+    ValueError: corrupt pyaig snapshot
+    """
+
+    buf = memoryview(buf).cast('B').toreadonly()
+
+    magic, version, byteorder, n_sections = _snapshot_header.unpack_from(buf, 0)
+
+    if magic != _SNAPSHOT_MAGIC:
+        raise ValueError('not a pyaig snapshot')
+
+    if version != _SNAPSHOT_VERSION or n_sections != len(_snapshot_sections):
+        raise ValueError('unsupported pyaig snapshot version %d'%version)
+
+    if byteorder != (0 if sys.byteorder == 'little' else 1):
+        raise ValueError('pyaig snapshot was created on a machine with a different byte order')
+
+    sections = []
+
+    for k, (_, typecode) in enumerate(_snapshot_sections):
+        tc, offset, count = _snapshot_section.unpack_from(buf, _snapshot_header.size + k * _snapshot_section.size)
+        if tc != typecode.encode('ascii'):
+            raise ValueError('corrupt pyaig snapshot')
+        itemsize = array(typecode).itemsize
+        if offset + count*itemsize > len(buf):
+            raise ValueError('truncated pyaig snapshot')
+        sections.append( buf[ offset : offset + count*itemsize ].cast(typecode) )
+
+    (
+        types, fanins0, fanins1, latch_init, latch_next,
+        pis, latches, buffers, po_fanins, po_types,
+        sorted_pis, ands,
+        po_type_keys, po_type_offsets, po_type_ids,
+        justice_offsets, justice_ids,
+        name_ids, name_kinds, name_offsets, name_blob,
+        po_name_ids, po_name_kinds, po_name_offsets, po_name_blob
+    ) = sections
+
+    aig = FrozenAIG()
+
+    aig._name = None
+    aig._flat_name = lambda n: n
+
+    aig._nodes = _Nodes.from_arrays( (types, fanins0, fanins1, latch_init, latch_next) )
+
+    aig._pis = pis
+    aig._latches = latches
+    aig._buffers = buffers
+    aig._po_fanins = po_fanins
+    aig._po_types = po_types
+    aig._justice = tuple( justice_ids[ justice_offsets[j] : justice_offsets[j+1] ] for j in xrange(len(justice_offsets)-1) )
+
+    aig._sorted_pis = sorted_pis
+    aig._ands = ands
+    aig._pos_by_type = { t:po_type_ids[ po_type_offsets[k] : po_type_offsets[k+1] ] for k, t in enumerate(po_type_keys) }
+
+    def load_names(aig):
+
+        aig._id_to_name = dict( _decode_names(name_ids, name_kinds, name_offsets, name_blob) )
+        aig._name_to_id = { n:f for f, n in iteritems(aig._id_to_name) }
+
+        aig._po_to_name = dict( _decode_names(po_name_ids, po_name_kinds, po_name_offsets, po_name_blob) )
+        aig._name_to_po = { n:po for po, n in iteritems(aig._po_to_name) }
+
+    aig._load_names = load_names
+
+    return aig
+
+
+def share_aig(aig):
+    """ copy 'aig' (an AIG or a FrozenAIG) into a new multiprocessing.shared_memory block and return it.
+    Other processes can attach to the block by name, using attach_aig(). The caller owns the block,
+    and should close() and unlink() it when the workers are done.
+
+    >>> aig = AIG()
+    >>> po = aig.create_po( aig.create_and(aig.create_pi('a'), aig.create_pi('b')), name='o' )
+    >>> shm = share_aig(aig)
+    >>> frozen = attach_aig(shm.name)
+    >>> list(frozen.get_and_gates()), frozen.get_id_by_name('b'), frozen.get_name_by_po(po)
+    ([6], 4, 'o')
+    >>> flatten_aiger(frozen) == flatten_aiger(aig)
+    True
+    >>> shm.close()
+    >>> shm.unlink()
+    """
+
+    from multiprocessing import shared_memory
+
+    arrays = _snapshot_arrays(aig)
+    size, layout = _snapshot_layout(arrays)
+
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    _write_snapshot(arrays, layout, shm.buf)
+
+    _shared_names.add(shm.name)
+
+    return shm
+
+# the names of the blocks created by share_aig() in this process
+
+_shared_names = set()
+
+
+def attach_aig(name):
+    """ attach to a shared memory block created by share_aig(), return a FrozenAIG viewing it without
+    copying. Only the header is parsed, names are decoded on first use. The block stays mapped while
+    the FrozenAIG is alive; arrays taken from it must not outlive it.
+
+    The block outlives the processes that attach to it:
+
+    >>> import os, subprocess, sys, pyaig
+    >>> aig = AIG()
+    >>> po = aig.create_po( aig.create_and(aig.create_pi(), aig.create_pi()) )
+    >>> shm = share_aig(aig)
+    >>> env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(pyaig.__file__)))
+    >>> script = 'import sys, pyaig; print(pyaig.attach_aig(sys.argv[1]).n_ands())'
+    >>> p = subprocess.run([sys.executable, '-c', script, shm.name], env=env, capture_output=True)
+    >>> p.stdout, p.stderr
+    (b'1\\n', b'')
+    >>> attach_aig(shm.name).n_ands()
+    1
+    >>> shm.close()
+    >>> shm.unlink()
+    """
+
+    import multiprocessing
+
+    from multiprocessing import resource_tracker, shared_memory
+
+    try:
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before Python 3.13, attaching registers the block with the resource tracker, which
+        # unlinks it when the process exits. Unless the creator registered it with the same
+        # tracker, as processes started by multiprocessing share the tracker of their parent,
+        # take it back.
+        shm = shared_memory.SharedMemory(name=name)
+        if multiprocessing.parent_process() is None and shm.name not in _shared_names:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+
+    # the FrozenAIG keeps the block mapped as long as its views into it exist
+
+    aig = _load_snapshot(shm.buf)
+    aig._shm = shm
+
+    return aig
+
+
+def write_snapshot(aig, f):
+    """ write 'aig' (an AIG or a FrozenAIG) to the file name or file object 'f' in the snapshot
+    format, which read_snapshot() maps into memory without parsing it """
+
+    if type(f) == str:
+        with open(f, "wb") as fout:
+            return write_snapshot(aig, fout)
+
+    arrays = _snapshot_arrays(aig)
+    size, layout = _snapshot_layout(arrays)
+
+    header = bytearray( layout[0][0] )
+    _write_snapshot_header(arrays, layout, header)
+
+    f.write(header)
+    pos = len(header)
+
+    for a, (offset, nbytes) in zip(arrays, layout):
+        f.write( bytes(offset - pos) )
+        f.write( memoryview(a).cast('B') )
+        pos = offset + nbytes
+
+
+def read_snapshot(f, frozen=False):
+    """ map the snapshot file written by write_snapshot() into memory, given its name or a file
+    object, and return it as an AIG, or as a FrozenAIG if 'frozen' is True
+
+    Only the header is parsed, the arrays are read from the file by the OS as they are accessed
+    and names are decoded on first use, see FrozenAIG.thaw() for the AIG.
+
+    >>> import os, tempfile
+    >>> aig = AIG()
+    >>> a, b = aig.create_pi('a'), aig.create_pi('b')
+    >>> po = aig.create_po( aig.create_and(a, b), name='o' )
+    >>> fd, path = tempfile.mkstemp()
+    >>> os.close(fd)
+    >>> write_snapshot(aig, path)
+    >>> loaded = read_snapshot(path)
+    >>> loaded.create_and(b, a), loaded.create_and(a, AIG.negate(b)), loaded.get_name_by_po(po)
+    (6, 8, 'o')
+    >>> flatten_aiger( read_snapshot(path, frozen=True) ) == flatten_aiger(aig)
+    True
+    >>> del loaded
+    >>> os.remove(path)
+    """
+
+    import mmap
+
+    if type(f) == str:
+        with open(f, "rb") as fin:
+            return read_snapshot(fin, frozen)
+
+    # the views into the mapping keep it alive, and it outlives the file object
+
+    buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    aig = _load_snapshot(buf)
+
+    return aig if frozen else aig.thaw()
+
+
+def _read_aiger_snapshot(path):
+    """ read the AIGER file 'path' in a worker process, return (path, snapshot, seconds, error) """
+
+    start = time.time()
+
+    try:
+
+        aig = read_aiger(path)
+
+        arrays = _snapshot_arrays(aig)
+        size, layout = _snapshot_layout(arrays)
+
+        buf = bytearray(size)
+        _write_snapshot(arrays, layout, buf)
+
+        return path, buf, time.time() - start, None
+
+    except Exception:
+        return path, None, time.time() - start, traceback.format_exc()
+
+
+def read_aiger_many(paths, workers=None):
+    """ read the AIGER files 'paths' in a pool of 'workers' processes (by default, one per CPU)
+
+    Yield a tuple (path, aig, seconds, error) for each file, as soon as it is read, so not
+    necessarily in the order of 'paths'. 'aig' is a FrozenAIG, or None if reading failed, in which
+    case 'error' is the traceback of the failure. 'seconds' is the time the worker took to read
+    the file. The AIGs are sent back as snapshots, which are used as is, without parsing them
+    again. With workers=1, the files are read in the calling process.
+
+    >>> import os, shutil, tempfile
+    >>> aig = AIG()
+    >>> po = aig.create_po( aig.create_and(aig.create_pi(), aig.create_pi()) )
+    >>> tmp = tempfile.mkdtemp()
+    >>> paths = [ os.path.join(tmp, name) for name in ('a.aig', 'b.aag.gz', 'missing.aig') ]
+    >>> _ = write_aiger(aig, paths[0]), write_aiger(aig, paths[1])
+    >>> results = { os.path.basename(path):(aig, error) for path, aig, _, error in read_aiger_many(paths, workers=2) }
+    >>> [ results[name][0].n_ands() for name in ('a.aig', 'b.aag.gz') ], results['missing.aig'][0]
+    ([1, 1], None)
+    >>> 'No such file' in results['missing.aig'][1]
+    True
+    >>> shutil.rmtree(tmp)
+    """
+
+    if workers == 1:
+
+        for path in paths:
+
+            path, buf, seconds, error = _read_aiger_snapshot(path)
+            yield path, None if buf is None else _load_snapshot(buf), seconds, error
+
+        return
+
+    import multiprocessing
+
+    pool = multiprocessing.Pool(workers)
+
+    try:
+
+        for path, buf, seconds, error in pool.imap_unordered(_read_aiger_snapshot, paths):
+            yield path, None if buf is None else _load_snapshot(buf), seconds, error
+
+    finally:
+        pool.terminate()
+        pool.join()
@@ -2,8 +2,10 @@ from __future__ import print_function
 from future.utils import iteritems
 from past.builtins import xrange
 
+import random
+
 from .aig import AIG
-from .aig_io import read_aiger
+from .aig_io import read_aiger, share_aig, attach_aig
 
 
 def filter_lines(f):
@@ -12,10 +14,7 @@ def filter_lines(f):
 
         line = line.strip()
 
-        if not line:
-            continue
-
-        elif line.startswith(b'u'):
+        if line.startswith(b'u'):
             continue
 
         elif line.startswith(b'c'):
@@ -25,6 +24,17 @@ def filter_lines(f):
 
 
 def read_cex(f):
+    """ read a witness in the AIGER format from the file object 'f', return (latch_values, pi_values)
+
+    After the property line, empty lines are the values of an AIG without latches or PIs. The
+    empty lines at the end are only frames if they are followed by the '.' line.
+
+    >>> import io
+    >>> read_cex( io.BytesIO(b'1\\nb0\\n\\n01\\n10\\n.\\n') )
+    ([], [[0, 1], [1, 0]])
+    >>> read_cex( io.BytesIO(b'1\\nb0\\n01\\n\\n\\n.\\n') )
+    ([0, 1], [[], []])
+    """
 
     V = { b'0': 0, b'1':1, 0:0, 1:0, '0':0, '1':1, ord('0'):0, ord('1'):1 }
 
@@ -34,21 +44,34 @@ def read_cex(f):
     latch_values = None
     pi_values = []
 
+    # the number of empty PI lines not yet known to be frames
+
+    empty = 0
+
     for line in filter_lines(f):
 
-        if result is None:
+        if not line and prop is None:
+            continue
+
+        elif result is None:
             result = line
 
         elif prop is None:
             prop = line
 
-        elif line=='.':
+        elif line in (b'.', '.'):
+            pi_values.extend( [] for _ in xrange(empty) )
             break
 
         elif latch_values is None:
             latch_values = [V[c] for c in line]
 
+        elif not line:
+            empty += 1
+
         else:
+            pi_values.extend( [] for _ in xrange(empty) )
+            empty = 0
             pi_values.append([V[c] for c in line])
 
     return latch_values, pi_values
@@ -100,6 +123,565 @@ def simulate(aig, latch_values, pi_values):
     return simulation
 
 
+class word_values(object):
+    """ the values of the nodes of an AIG in one frame of simulate_words(), bit k of each
+    value is the value in trace k """
+
+    def __init__(self, values, mask):
+        self.values = values
+        self.mask = mask
+
+    def __getitem__(self, f):
+        v = self.values[f>>1]
+        return v ^ self.mask if f&1 else v
+
+    def iteritems(self):
+        return ( (i<<1, v) for i, v in enumerate(self.values) )
+
+
+def pack_traces(traces):
+    """ pack 'traces', a sequence of (latch_values, pi_values) pairs in the format of simulate(),
+    into a (latch_values, pi_values, width) triple for simulate_words(), with trace k in bit k.
+    Traces shorter than the longest one are padded with 0 inputs. """
+
+    traces = list(traces)
+
+    n_latches = len(traces[0][0]) if traces else 0
+    n_frames = max( len(pi_values) for _, pi_values in traces ) if traces else 0
+
+    latch_words = [0] * n_latches
+    pi_words = [ [] for _ in xrange(n_frames) ]
+
+    for k, (latch_values, pi_values) in enumerate(traces):
+
+        for i, v in enumerate(latch_values):
+            latch_words[i] |= v << k
+
+        for frame, values in zip(pi_words, pi_values):
+
+            if len(frame) < len(values):
+                frame.extend( [0] * (len(values) - len(frame)) )
+
+            for i, v in enumerate(values):
+                frame[i] |= v << k
+
+    return latch_words, pi_words, len(traces)
+
+
+def _check_no_buffers(aig):
+    """ the bit-parallel simulators do not evaluate buffers, only buffers converted to PIs are allowed """
+    assert not any( True for _ in aig.get_buffers() ), 'simulate: buffers are not supported, convert them to PIs'
+
+
+def simulate_words(aig, latch_values, pi_values, width):
+    """ simulate 'width' traces at once, packed in integers with bit k holding the value in
+    trace k, see pack_traces(). Like simulate(), 'latch_values' has one word per latch and
+    'pi_values' has one list of words per frame, one per PI. Return a list of word_values, one
+    per frame. The AIG must not have buffers, other than those converted to PIs.
+
+    The traces can be as wide as needed, each frame evaluates every AND gate once, with a
+    single integer operation for all the traces.
+
+    >>> from . import primitives
+    >>> aig = AIG()
+    >>> latches = primitives.counter(aig, 3, aig.create_pi())
+    >>> traces = [ ([0, 0, 0], [[1], [1], [0], [1]]), ([1, 1, 0], [[1], [0], [1]]) ]
+    >>> latch_words, pi_words, width = pack_traces(traces)
+    >>> simulation = simulate_words(aig, latch_words, pi_words, width)
+    >>> [ [ simulation[i][l] for l in latches ] for i in xrange(3) ]
+    [[2, 2, 0], [1, 0, 2], [0, 1, 2]]
+    >>> all( simulation[i][l] >> k & 1 == simulate(aig, *trace)[i][l]
+    ...      for k, trace in enumerate(traces) for i in xrange(3) for l in latches )
+    True
+    """
+
+    return list( _iter_word_frames(aig, latch_values, pi_values, (1 << width) - 1) )
+
+
+def _iter_word_frames(aig, latch_values, pi_values, mask):
+    """ yield the word_values of each frame of simulate_words(), one at a time """
+
+    assert len(latch_values) == aig.n_latches()
+
+    _check_no_buffers(aig)
+
+    # each AND gate, with the masks that negate its fanins, precomputed once for all the frames
+
+    gates = []
+
+    for f in aig.get_and_gates():
+        left, right = aig.get_and_fanins(f)
+        gates.append( (f>>1, left>>1, mask if left&1 else 0, right>>1, mask if right&1 else 0) )
+
+    pis = [ f>>1 for f in aig.get_pis() ]
+    latches = [ l>>1 for l in aig.get_latches() ]
+    nexts = [ aig.get_next(l) for l in aig.get_latches() ]
+
+    state = list(latch_values)
+
+    for frame_pi_values in pi_values:
+
+        values = [0] * len(aig)
+
+        for i, v in zip(latches, state):
+            values[i] = v
+
+        for i, v in zip(pis, frame_pi_values):
+            values[i] = v
+
+        for g, l, xl, r, xr in gates:
+            values[g] = (values[l] ^ xl) & (values[r] ^ xr)
+
+        frame = word_values(values, mask)
+
+        state = [ frame[f] for f in nexts ]
+
+        yield frame
+
+
+def _watched_literal(aig, w):
+    # a literal, or the name of a node or of a PO
+
+    if isinstance(w, (str, bytes)):
+        if aig.name_exists(w):
+            return aig.get_id_by_name(w)
+        return aig.get_po_fanin( aig.get_po_by_name(w) )
+
+    return w
+
+
+def iter_simulate(aig, latch_values, pi_values, watch, width=1):
+    """ simulate like simulate(), or like simulate_words() if 'width' is larger than 1, and yield
+    a tuple with the values of the signals in 'watch' for each frame. 'watch' lists literals,
+    names of nodes or names of POs. 'pi_values' can be any iterable, such as a generator, and
+    only the values of the current frame are kept, so the memory does not grow with the number
+    of frames.
+
+    >>> from . import primitives
+    >>> aig = AIG()
+    >>> enable = aig.create_pi('enable')
+    >>> latches = primitives.counter(aig, 2, enable)
+    >>> po = aig.create_po( aig.create_and(latches[0], latches[1]), name='full' )
+    >>> frames = iter_simulate(aig, [0, 0], ( [1] for _ in xrange(1000000) ), ['full', latches[0], 'enable'])
+    >>> [ next(frames) for _ in xrange(5) ]
+    [(0, 0, 1), (0, 1, 1), (0, 0, 1), (1, 1, 1), (0, 0, 1)]
+    """
+
+    lits = [ _watched_literal(aig, w) for w in watch ]
+
+    for frame in _iter_word_frames(aig, latch_values, pi_values, (1 << width) - 1):
+        yield tuple( frame[f] for f in lits )
+
+
+# the AIG of a random_simulate() worker process, attached to the shared memory block of the parent
+
+_worker_aig = None
+
+def _attach_worker_aig(name):
+    global _worker_aig
+    _worker_aig = attach_aig(name)
+
+
+def _random_batch(task):
+    """ simulate a batch of random traces on the AIG of the worker, return the number of frames in
+    which each PO is 1, the number of frames simulated and the trace that hits a BAD_STATES PO first,
+    if any, in the format of read_cex() """
+
+    seed, width, depth = task
+
+    aig = _worker_aig
+    r = random.Random(seed)
+    mask = (1 << width) - 1
+
+    latch_values = []
+
+    for l in aig.get_latches():
+        init = aig.get_init(l)
+        latch_values.append( mask if init == AIG.INIT_ONE else r.getrandbits(width) if init == AIG.INIT_NONDET else 0 )
+
+    # the inputs are kept, to extract the failing trace
+
+    n_pis = aig.n_pis()
+    pi_values = []
+
+    def frames():
+        for _ in xrange(depth):
+            pi_values.append( [ r.getrandbits(width) for _ in xrange(n_pis) ] )
+            yield pi_values[-1]
+
+    po_fanins = [ f for _, f, _ in aig.get_pos() ]
+    bad = [ po for po, _, _ in aig.get_pos_by_type(AIG.BAD_STATES) ]
+    constraints = [ po for po, _, _ in aig.get_pos_by_type(AIG.CONSTRAINT) ]
+
+    hits = [0] * len(po_fanins)
+    valid = mask
+
+    for k, frame in enumerate( _iter_word_frames(aig, latch_values, frames(), mask) ):
+
+        values = [ frame[f] for f in po_fanins ]
+
+        # a trace is only valid as long as all the constraints hold
+
+        for po in constraints:
+            valid &= values[po]
+
+        for po, v in enumerate(values):
+            hits[po] += bin(v & valid).count('1')
+
+        for j, po in enumerate(bad):
+
+            v = values[po] & valid
+
+            if v:
+
+                t = (v & -v).bit_length() - 1
+
+                lines = [ b'1', b'b%d'%j ]
+                lines.append( b''.join( b'1' if x >> t & 1 else b'0' for x in latch_values ) )
+                lines.extend( b''.join( b'1' if x >> t & 1 else b'0' for x in frame ) for frame in pi_values )
+                lines.append( b'.' )
+
+                return hits, width * (k+1), b'\n'.join(lines) + b'\n'
+
+    return hits, width * depth, None
+
+
+def random_simulate(aig, batches, width=64, depth=100, seed=0, workers=None):
+    """ simulate 'batches' batches of 'width' random traces of 'depth' frames, in a pool of
+    'workers' processes (by default, one per CPU) that share the AIG, see share_aig()
+
+    Stop as soon as a trace hits a BAD_STATES PO, under the constraints. Return a tuple
+    (cex, hits, n_frames): the trace that hit it, in the format of read_cex(), or None; the
+    number of frames, over all the traces, in which each PO is 1; and the number of frames
+    simulated. The random values of batch 'k' only depend on 'seed' and 'k'. With workers=1,
+    the batches are simulated in the calling process.
+
+    >>> import io
+    >>> from . import primitives
+    >>> aig = AIG()
+    >>> latches = primitives.counter(aig, 4, aig.create_pi())
+    >>> all_ones = aig.create_and( aig.create_and(latches[0], latches[1]), aig.create_and(latches[2], latches[3]) )
+    >>> po = aig.create_po( all_ones, po_type=AIG.BAD_STATES )
+    >>> cex, hits, n_frames = random_simulate(aig, batches=8, width=8, depth=30, workers=2)
+    >>> latch_values, pi_values = read_cex( io.BytesIO(cex) )
+    >>> latch_values, len(pi_values) > 15, simulate(aig, latch_values, pi_values)[-1][ aig.get_po_fanin(po) ]
+    ([0, 0, 0, 0], True, 1)
+    >>> random_simulate(aig, batches=4, width=8, depth=10, workers=1)
+    (None, [0], 320)
+
+    The frames of an AIG without PIs are empty lines:
+
+    >>> aig = AIG()
+    >>> l0, l1 = aig.create_latch(), aig.create_latch()
+    >>> aig.set_next(l0, AIG.get_const1()), aig.set_next(l1, l0)
+    (None, None)
+    >>> po = aig.create_po( aig.create_and(l0, l1), po_type=AIG.BAD_STATES )
+    >>> cex, _, _ = random_simulate(aig, batches=1, width=4, depth=5, workers=1)
+    >>> cex, simulate( aig, *read_cex(io.BytesIO(cex)) )[-1][ aig.get_po_fanin(po) ]
+    (b'1\\nb0\\n00\\n\\n\\n\\n.\\n', 1)
+    """
+
+    tasks = ( ('%d:%d'%(seed, k), width, depth) for k in xrange(batches) )
+
+    hits = [0] * aig.n_pos()
+    n_frames = 0
+
+    def merge(result):
+        batch_hits, batch_frames, cex = result
+        for po, h in enumerate(batch_hits):
+            hits[po] += h
+        return batch_frames, cex
+
+    if workers == 1:
+
+        global _worker_aig
+        _worker_aig = aig
+
+        try:
+            for task in tasks:
+                batch_frames, cex = merge( _random_batch(task) )
+                n_frames += batch_frames
+                if cex is not None:
+                    return cex, hits, n_frames
+        finally:
+            _worker_aig = None
+
+        return None, hits, n_frames
+
+    import multiprocessing
+
+    shm = share_aig(aig)
+
+    try:
+
+        pool = multiprocessing.Pool(workers, initializer=_attach_worker_aig, initargs=(shm.name,))
+
+        try:
+
+            for result in pool.imap_unordered(_random_batch, tasks):
+                batch_frames, cex = merge(result)
+                n_frames += batch_frames
+                if cex is not None:
+                    return cex, hits, n_frames
+
+        finally:
+            pool.terminate()
+            pool.join()
+
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return None, hits, n_frames
+
+
+class wavefront_simulator(object):
+    """ Combinational simulation of an AIG with NumPy, over matrices of uint64 patterns.
+
+    The AND gates are grouped by level once, when the simulator is created. Each simulate()
+    call then evaluates one level at a time, with vectorized gathers of the fanin rows, so
+    there is no Python loop over the gates. Latches are inputs, like the PIs. The AIG must not
+    have buffers, other than those converted to PIs, and should not change while the simulator
+    is in use.
+
+    >>> import numpy
+    >>> aig = AIG()
+    >>> a, b, c = aig.create_pi(), aig.create_pi(), aig.create_pi()
+    >>> po = aig.create_po( aig.create_and( aig.create_and(a, AIG.negate(b)), c ) )
+    >>> sim = wavefront_simulator(aig)
+    >>> _ = sim.simulate( numpy.array([[0b1100], [0b1010], [0b0111]], dtype=numpy.uint64) )
+    >>> sim.get_po_values()[po], sim.get_values( AIG.negate(a) )
+    (array([4], dtype=uint64), array([18446744073709551603], dtype=uint64))
+    """
+
+    def __init__(self, aig):
+
+        import numpy
+
+        self._aig = aig
+
+        _check_no_buffers(aig)
+
+        nodes = aig._nodes
+
+        ands = numpy.array( [ f>>1 for f in aig.get_and_gates() ], dtype=numpy.int64 )
+        lefts = numpy.frombuffer(nodes._left, dtype=numpy.int32)[ands].astype(numpy.int64)
+        rights = numpy.frombuffer(nodes._right, dtype=numpy.int32)[ands].astype(numpy.int64)
+
+        # the fanins of a gate are earlier gates, PIs, latches or the constant
+
+        levels = [0] * len(nodes)
+
+        for i, l, r in zip( ands.tolist(), (lefts >> 1).tolist(), (rights >> 1).tolist() ):
+            a = levels[l]
+            b = levels[r]
+            levels[i] = ( a if a > b else b ) + 1
+
+        and_levels = numpy.array(levels, dtype=numpy.int64)[ands]
+
+        order = numpy.argsort(and_levels, kind='stable')
+        bounds = numpy.cumsum( numpy.bincount(and_levels) ).tolist()
+
+        def complement(fs):
+            return numpy.where( fs & 1, ~numpy.uint64(0), numpy.uint64(0) ).astype(numpy.uint64)[:, None]
+
+        ands = ands[order]
+        left_ids = lefts[order] >> 1
+        right_ids = rights[order] >> 1
+        left_masks = complement(lefts[order])
+        right_masks = complement(rights[order])
+
+        self._levels = [
+            ( ands[s:e], left_ids[s:e], left_masks[s:e], right_ids[s:e], right_masks[s:e] )
+            for s, e in zip(bounds, bounds[1:]) if e > s
+            ]
+
+        # ternary simulation keeps the rails of literal 'f' in row 'f', see simulate_ternary()
+
+        left_lits = lefts[order]
+        right_lits = rights[order]
+
+        self._ternary_levels = [
+            ( 2*ands[s:e], 2*ands[s:e]+1, left_lits[s:e], right_lits[s:e], left_lits[s:e]^1, right_lits[s:e]^1 )
+            for s, e in zip(bounds, bounds[1:]) if e > s
+            ]
+
+        self._n_nodes = len(nodes)
+        self._pis = numpy.array( [ f>>1 for f in aig.get_pis() ], dtype=numpy.int64 )
+        self._latches = numpy.array( [ l>>1 for l in aig.get_latches() ], dtype=numpy.int64 )
+        self._latch_inits = numpy.array( [ aig.get_init(l) == AIG.INIT_ONE for l in aig.get_latches() ], dtype=bool )
+        self._latch_zero_inits = numpy.array( [ aig.get_init(l) == AIG.INIT_ZERO for l in aig.get_latches() ], dtype=bool )
+        self._latch_nexts = numpy.array( [ aig.get_next(l) or 0 for l in aig.get_latches() ], dtype=numpy.int64 )
+
+        po_fanins = numpy.array( [ aig.get_po_fanin(po) for po in xrange(aig.n_pos()) ], dtype=numpy.int64 )
+        self._po_fanins = po_fanins
+        self._po_ids = po_fanins >> 1
+        self._po_masks = complement(po_fanins)
+
+        self.values = None
+        self.rails = None
+
+    def simulate(self, pi_patterns, latch_patterns=None):
+        """ simulate the patterns 'pi_patterns', a uint64 matrix with a row per PI, in the order of
+        AIG.get_pis(), and a column per word of patterns. The latches take the values of the rows
+        of 'latch_patterns', or by default their initial values. Return the values of all the
+        nodes, a matrix with a row per node id, which is also kept in 'values'. """
+
+        import numpy
+
+        pi_patterns = numpy.asarray(pi_patterns, dtype=numpy.uint64)
+        assert pi_patterns.shape[0] == len(self._pis)
+
+        values = numpy.zeros( (self._n_nodes, pi_patterns.shape[1]), dtype=numpy.uint64 )
+
+        values[self._pis] = pi_patterns
+
+        if latch_patterns is None:
+            values[ self._latches[self._latch_inits] ] = ~numpy.uint64(0)
+        else:
+            values[self._latches] = latch_patterns
+
+        for ands, lefts, left_masks, rights, right_masks in self._levels:
+            values[ands] = (values[lefts] ^ left_masks) & (values[rights] ^ right_masks)
+
+        self.values = values
+
+        return values
+
+    def get_values(self, f):
+        """ return the row of patterns of the literal 'f' in the latest simulation """
+        v = self.values[f>>1]
+        return ~v if f&1 else v
+
+    def get_po_values(self):
+        """ return the values of the POs in the latest simulation, a matrix with a row per PO id """
+        return self.values[self._po_ids] ^ self._po_masks
+
+    # Ternary simulation
+
+    def simulate_ternary(self, pi_values=None, latch_values=None, width=1):
+        """ simulate with the values 0, 1 and X (unknown), in dual-rail form: the values of a row
+        of patterns are a pair (ones, zeros) of uint64 rows, in which a bit is set in 'ones' if
+        the value of the pattern is 1, in 'zeros' if it is 0 and in neither if it is X.
+
+        'pi_values' is a pair of matrices with a row per PI, all the PIs are X if it is None.
+        'latch_values' is a pair of matrices with a row per latch, by default the initial values
+        of the latches, X for INIT_NONDET. 'width' is the number of words of patterns if neither
+        is given. Return the matrix of the rails of all the literals: the ones of literal 'f' are
+        in row 'f' and its zeros in row 'f^1'. It is also kept in 'rails'.
+
+        Ternary simulation with X inputs is an abstraction of all their binary values, a 0 or 1
+        result holds for all of them. To shrink a counterexample, for example, each pattern can
+        turn different inputs of the trace into X, and check whether the PO remains 1.
+
+        >>> import numpy
+        >>> aig = AIG()
+        >>> a, b = aig.create_pi(), aig.create_pi()
+        >>> po = aig.create_po( aig.create_and(a, AIG.negate(b)) )
+        >>> sim = wavefront_simulator(aig)
+        >>> ones = numpy.array([[0b0011], [0b0000]], dtype=numpy.uint64)
+        >>> zeros = numpy.array([[0b0100], [0b0101]], dtype=numpy.uint64)
+        >>> _ = sim.simulate_ternary( (ones, zeros) )
+        >>> [ int(rail[po, 0]) for rail in sim.get_po_ternary_values() ]
+        [1, 4]
+        """
+
+        import numpy
+
+        if pi_values is not None:
+            width = numpy.shape(pi_values[0])[1]
+        elif latch_values is not None:
+            width = numpy.shape(latch_values[0])[1]
+
+        full = ~numpy.uint64(0)
+
+        rails = numpy.zeros( (2*self._n_nodes, width), dtype=numpy.uint64 )
+        rails[1] = full
+
+        if pi_values is not None:
+            rails[2*self._pis] = pi_values[0]
+            rails[2*self._pis+1] = pi_values[1]
+
+        if latch_values is None:
+            rails[ 2*self._latches[self._latch_inits] ] = full
+            rails[ 2*self._latches[self._latch_zero_inits]+1 ] = full
+        else:
+            rails[2*self._latches] = latch_values[0]
+            rails[2*self._latches+1] = latch_values[1]
+
+        # an AND gate is 1 if both fanins are 1, and 0 if either is 0
+
+        for ones, zeros, lefts, rights, left_negs, right_negs in self._ternary_levels:
+            rails[ones] = rails[lefts] & rails[rights]
+            rails[zeros] = rails[left_negs] | rails[right_negs]
+
+        self.rails = rails
+
+        return rails
+
+    def get_ternary_values(self, f):
+        """ return the pair of rails (ones, zeros) of the literal 'f' in the latest ternary simulation """
+        return self.rails[f], self.rails[f^1]
+
+    def get_po_ternary_values(self):
+        """ return the pair of rails (ones, zeros) of the POs in the latest ternary simulation, each a
+        matrix with a row per PO id """
+        return self.rails[self._po_fanins], self.rails[self._po_fanins^1]
+
+    def get_next_ternary_state(self):
+        """ return the pair of rails of the next-state functions of the latches in the latest ternary
+        simulation, which can be passed as 'latch_values' to simulate the next frame """
+        return self.rails[self._latch_nexts], self.rails[self._latch_nexts^1]
+
+
+def find_constant_latches(aig, max_frames=1000):
+    """ return a dictionary that maps the latches of 'aig' that are constant in all the reachable
+    states to their value, by ternary simulation from the initial state with X inputs, until the
+    ternary states repeat. Return None if they do not repeat within 'max_frames' frames.
+
+    >>> aig = AIG()
+    >>> pi = aig.create_pi()
+    >>> l0, l1, l2 = aig.create_latch(), aig.create_latch(), aig.create_latch(init=AIG.INIT_ONE)
+    >>> aig.set_next(l0, aig.create_and(l0, pi))
+    >>> aig.set_next(l1, pi)
+    >>> aig.set_next(l2, AIG.negate( aig.create_and(AIG.negate(l2), pi) ))
+    >>> find_constant_latches(aig) == { l0:0, l2:1 }
+    True
+    """
+
+    import numpy
+
+    sim = wavefront_simulator(aig)
+    latches = list( aig.get_latches() )
+
+    state = None
+    seen = set()
+
+    always_one = numpy.ones( len(latches), dtype=bool )
+    always_zero = numpy.ones( len(latches), dtype=bool )
+
+    for _ in xrange(max_frames):
+
+        rails = sim.simulate_ternary(latch_values=state)
+
+        always_one &= rails[ 2*sim._latches, 0 ] != 0
+        always_zero &= rails[ 2*sim._latches+1, 0 ] != 0
+
+        state = sim.get_next_ternary_state()
+
+        key = state[0].tobytes() + state[1].tobytes()
+
+        if key in seen:
+            return dict(
+                [ (l, 1) for l, c in zip(latches, always_one) if c ] +
+                [ (l, 0) for l, c in zip(latches, always_zero) if c ]
+                )
+
+        seen.add(key)
+
+    return None
+
+
 def print_cex( aig, simulation, symbols):
 
     maxlen = +max( len(sym) for sym in symbols )